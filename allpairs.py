@@ -0,0 +1,123 @@
+# allpairs.py
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+class AllPairs:
+    """
+    Matriz de distancias entre todos los pares de nodos más la matriz de
+    siguiente salto, calculadas con un Dijkstra por origen sobre el CSR.
+
+    - dist[i, j]: coste de i a j con multiplicador `scale` (inf si no hay ruta)
+    - next_hop[i, j]: id del nodo que sigue a i en el camino hacia j (-1 si no hay)
+    - base_version: Graph.base_version con la que se calculó; un cambio del
+      multiplicador global solo reescala las distancias (los caminos no cambian)
+
+    Memoria O(V²): pensado para venues de hasta unos pocos miles de nodos.
+    """
+
+    def __init__(self, names, dist, next_hop, base_version, scale, avoid_types=None):
+        self.names = list(names)
+        self.index = {n: i for i, n in enumerate(self.names)}
+        self.dist = dist
+        self.next_hop = next_hop
+        self.base_version = base_version
+        self.scale = scale
+        self.avoid_types = list(avoid_types or [])
+
+    @classmethod
+    def compute(cls, graph, avoid_types=None, workers=None):
+        """
+        Ejecuta un Dijkstra por cada origen. Con workers > 1 los orígenes se
+        reparten entre procesos; cada proceso recibe el CSR una sola vez.
+        """
+        csr = graph.csr()
+        n = csr.num_nodes()
+        args = (csr, avoid_types) + graph.weight_factors()
+        dist = np.full((n, n), np.inf)
+        next_hop = np.full((n, n), -1, dtype=np.int32)
+
+        sources = list(range(n))
+        if workers and workers > 1 and n > 1:
+            chunk = max(1, n // (workers * 4))
+            chunks = [sources[i:i + chunk] for i in range(0, n, chunk)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=args) as pool:
+                for rows in pool.map(_rows_for, chunks):
+                    _store(dist, next_hop, rows)
+        else:
+            _store(dist, next_hop, _compute_rows(args, sources))
+
+        return cls(csr.names, dist, next_hop, graph.base_version,
+                   graph.dynamic_multiplier, avoid_types)
+
+    # ----------------------------------------------------------------------
+    # CONSULTAS
+    # ----------------------------------------------------------------------
+    def is_valid(self, graph):
+        return self.base_version == graph.base_version
+
+    def distance(self, a, b, scale=None):
+        """Distancia a -> b; con scale se reescala al multiplicador actual."""
+        i, j = self.index.get(a), self.index.get(b)
+        if i is None or j is None:
+            return float('inf')
+        d = float(self.dist[i, j])
+        if scale is not None:
+            d *= scale / self.scale
+        return d
+
+    def path(self, a, b):
+        """Reconstruye el camino a -> b siguiendo next_hop en O(longitud)."""
+        i, j = self.index.get(a), self.index.get(b)
+        if i is None or j is None or self.next_hop[i, j] < 0:
+            return []
+        path = [a]
+        # cota de pasos por si hay aristas de peso 0 que formen ciclos
+        for _ in range(len(self.names)):
+            if i == j:
+                return path
+            i = int(self.next_hop[i, j])
+            path.append(self.names[i])
+        return []
+
+
+# --------------------------------------------------------------------------
+# CÁLCULO POR FILAS (también usado por los procesos del pool)
+# --------------------------------------------------------------------------
+_worker_args = None
+
+
+def _init_worker(*args):
+    global _worker_args
+    _worker_args = args
+
+
+def _rows_for(sources):
+    return _compute_rows(_worker_args, sources)
+
+
+def _compute_rows(args, sources):
+    csr, avoid_types, scale, node_zones, edge_zones = args
+    n = csr.num_nodes()
+    rows = []
+    for s in sources:
+        dist, prev, order = csr.sssp(s, avoid_types, scale, node_zones, edge_zones)
+        d_row = np.full(n, np.inf)
+        nh_row = np.full(n, -1, dtype=np.int32)
+        hop = {s: s}
+        # en orden de asentamiento el padre siempre se procesa antes que el hijo
+        for v in order[1:]:
+            p = prev[v]
+            hop[v] = v if p == s else hop[p]
+        ids = np.fromiter(order, dtype=np.int64, count=len(order))
+        d_row[ids] = [dist[v] for v in order]
+        nh_row[ids] = [hop[v] for v in order]
+        rows.append((s, d_row, nh_row))
+    return rows
+
+
+def _store(dist, next_hop, rows):
+    for s, d_row, nh_row in rows:
+        dist[s] = d_row
+        next_hop[s] = nh_row
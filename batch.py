@@ -0,0 +1,115 @@
+# batch.py
+import numpy as np
+
+
+class RouteTable:
+    """
+    Resultado de Graph.distance_table: dist[i, j] es el coste de sources[i]
+    a targets[j] (inf si no hay ruta). Los caminos se reconstruyen solo al
+    pedirlos, a partir del árbol de cada origen.
+    """
+
+    def __init__(self, csr, sources, targets, dist, trees):
+        self.csr = csr
+        self.sources = list(sources)
+        self.targets = list(targets)
+        self.dist = dist
+        self._trees = trees  # origen -> prev (ids)
+
+    def path(self, i, j):
+        return _tree_path(self.csr, self._trees, self.sources[i], self.targets[j],
+                          self.dist[i, j])
+
+
+class RouteBatch:
+    """
+    Resultado de Graph.route_many: dist[k] es el coste del par k y path(k)
+    su camino, reconstruido de forma perezosa.
+    """
+
+    def __init__(self, csr, pairs, dist, trees):
+        self.csr = csr
+        self.pairs = list(pairs)
+        self.dist = dist
+        self._trees = trees
+
+    def path(self, k):
+        start, end = self.pairs[k]
+        return _tree_path(self.csr, self._trees, start, end, self.dist[k])
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __iter__(self):
+        # (dist, camino) en el mismo orden que pairs
+        for k in range(len(self.pairs)):
+            yield float(self.dist[k]), self.path(k)
+
+
+# --------------------------------------------------------------------------
+# UN ÁRBOL POR ORIGEN
+# --------------------------------------------------------------------------
+def group_by_source(pairs):
+    """origen -> lista de índices de pares con ese origen (orden de aparición)."""
+    groups = {}
+    for k, (start, _) in enumerate(pairs):
+        groups.setdefault(start, []).append(k)
+    return groups
+
+
+def solve_source(csr, start, ends, avoid_types, factors):
+    """
+    Dijkstra desde start que se detiene cuando todos los destinos ends
+    están asentados. Devuelve ({destino: coste}, prev) o (None, None) si
+    start no existe.
+    """
+    s = csr.index.get(start)
+    if s is None:
+        return None, None
+    target_ids = {csr.index[e] for e in ends if e in csr.index}
+    scale, node_zones, edge_zones = factors
+    dist, prev, _ = csr.sssp(s, avoid_types, scale, node_zones, edge_zones,
+                             targets=target_ids)
+    costs = {}
+    for e in ends:
+        t = csr.index.get(e)
+        if t is not None and t in dist:
+            costs[e] = dist[t]
+    return costs, prev
+
+
+def distance_table(graph, sources, targets, avoid_types=None):
+    csr = graph.csr()
+    factors = graph.weight_factors()
+    dist = np.full((len(sources), len(targets)), np.inf)
+    trees = {}
+    first_row = {}  # origen -> fila donde ya se calculó
+    for i, start in enumerate(sources):
+        if start in first_row:
+            dist[i] = dist[first_row[start]]
+            continue
+        first_row[start] = i
+        costs, trees[start] = solve_source(csr, start, targets, avoid_types, factors)
+        if costs:
+            dist[i] = [costs.get(t, np.inf) for t in targets]
+    return RouteTable(csr, sources, targets, dist, trees)
+
+
+def route_many(graph, pairs, avoid_types=None):
+    csr = graph.csr()
+    factors = graph.weight_factors()
+    dist = np.full(len(pairs), np.inf)
+    trees = {}
+    for start, idx in group_by_source(pairs).items():
+        ends = [pairs[k][1] for k in idx]
+        costs, trees[start] = solve_source(csr, start, ends, avoid_types, factors)
+        if costs:
+            dist[idx] = [costs.get(e, np.inf) for e in ends]
+    return RouteBatch(csr, pairs, dist, trees)
+
+
+def _tree_path(csr, trees, start, end, d):
+    prev = trees.get(start)
+    if prev is None or not np.isfinite(d):
+        return []
+    return csr.path_to(prev, csr.index[end])
@@ -0,0 +1,272 @@
+# bench.py
+"""
+Banco de pruebas de rendimiento (independiente de la interfaz).
+
+    python bench.py                          # todos los tamaños, guarda bench_results.json
+    python bench.py --sizes small,medium --repeat 5
+    python bench.py --save-baseline          # guarda los resultados como línea base
+    python bench.py --baseline bench_baseline.json --threshold 0.25
+
+Mide enrutado, congestión, edición, E/S de escenarios y dibujo (backend Agg)
+sobre recintos generados con venue.build_venue. Por cada prueba registra:
+- time_min / time_median (s): tiempo de pared sin tracemalloc
+- peak_kb: pico de memoria de Python durante una llamada (tracemalloc)
+- alloc_blocks: bloques de memoria que siguen reservados tras la llamada
+Si hay línea base, marca como regresión toda prueba cuya mediana de tiempo
+o pico de memoria supere la base en más del umbral, y sale con código 1.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+
+from venue import build_venue  # noqa: E402
+from views import figure_floor, figure_3d  # noqa: E402
+
+# tamaño -> parámetros de build_venue
+SIZES = {
+    "small": dict(floors=4, width=10, depth=8),
+    "medium": dict(floors=8, width=30, depth=20),
+    "large": dict(floors=12, width=60, depth=40),
+}
+
+# las vistas de matplotlib solo se miden hasta este número de nodos
+# (las etiquetas de texto siguen siendo un artista por nodo)
+RENDER_MAX_NODES = 5000
+
+
+# --------------------------------------------------------------------------
+# PRUEBAS
+# --------------------------------------------------------------------------
+# Cada prueba recibe (grafo, rng) y devuelve una función sin argumentos que
+# hace UNA operación; se llama repeat veces. Las consultas limpian la caché
+# de rutas para medir el cálculo y no el acierto de caché.
+def _pairs(g, rng):
+    nodes = list(g.adj)
+    while True:
+        a, b = rng.sample(nodes, 2)
+        yield a, b
+
+
+def bench_dijkstra(g, rng):
+    pairs = _pairs(g, rng)
+
+    def run():
+        g.route_cache.clear()
+        g.dijkstra(*next(pairs))
+    return run
+
+
+def bench_dijkstra_with_penalty(g, rng):
+    pairs = _pairs(g, rng)
+    return lambda: g.dijkstra_with_penalty(*next(pairs), avoid_types=["stairs"])
+
+
+def bench_k_shortest_paths(g, rng):
+    pairs = _pairs(g, rng)
+
+    def run():
+        g.route_cache.clear()
+        g.k_shortest_paths(*next(pairs), k=3)
+    return run
+
+
+def bench_apply_congestion(g, rng):
+    nodes = list(g.adj)
+
+    def run():
+        g.set_zone_congestion(rng.choice(nodes), rng.uniform(1.5, 3.0))
+        g.apply_congestion()
+    return run
+
+
+def bench_set_dynamic_multiplier(g, rng):
+    return lambda: g.set_dynamic_multiplier(rng.uniform(0.5, 2.0))
+
+
+def bench_remove_node(g, rng):
+    victims = iter(rng.sample(list(g.adj), min(len(g.adj), 1000)))
+    return lambda: g.remove_node(next(victims))
+
+
+def bench_save_scenario(g, rng):
+    path = os.path.join(tempfile.mkdtemp(), "bench.json")
+    return lambda: _quiet(g.save_scenario, path)
+
+
+def bench_load_scenario(g, rng):
+    path = os.path.join(tempfile.mkdtemp(), "bench.json")
+    _quiet(g.save_scenario, path)
+    return lambda: _quiet(g.load_scenario, path)
+
+
+def bench_figure_floor(g, rng):
+    pairs = _pairs(g, rng)
+
+    def run():
+        g.route_cache.clear()
+        _, path = g.dijkstra(*next(pairs))
+        plt.close(figure_floor(g, 1, path))
+    return run
+
+
+def bench_figure_3d(g, rng):
+    pairs = _pairs(g, rng)
+
+    def run():
+        g.route_cache.clear()
+        _, path = g.dijkstra(*next(pairs))
+        plt.close(figure_3d(g, path))
+    return run
+
+
+# nombre -> (prueba, ¿es de dibujo?)
+BENCHMARKS = {
+    "dijkstra": (bench_dijkstra, False),
+    "dijkstra_with_penalty": (bench_dijkstra_with_penalty, False),
+    "k_shortest_paths": (bench_k_shortest_paths, False),
+    "apply_congestion": (bench_apply_congestion, False),
+    "set_dynamic_multiplier": (bench_set_dynamic_multiplier, False),
+    "remove_node": (bench_remove_node, False),
+    "save_scenario": (bench_save_scenario, False),
+    "load_scenario": (bench_load_scenario, False),
+    "figure_floor": (bench_figure_floor, True),
+    "figure_3d": (bench_figure_3d, True),
+}
+
+
+def _quiet(fn, *args):
+    # save/load_scenario imprimen un mensaje por llamada
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        return fn(*args)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+# --------------------------------------------------------------------------
+# MEDICIÓN
+# --------------------------------------------------------------------------
+def measure(factory, size, repeat, seed):
+    """Mide una prueba sobre un grafo recién generado del tamaño dado."""
+    g = build_venue(seed=seed, **SIZES[size])
+    run = factory(g, random.Random(seed))
+    run()  # calentamiento (CSR, tablas perezosas)
+
+    times = []
+    gc.collect()
+    for _ in range(repeat):
+        t = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t)
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks
+
+    return {
+        "time_min": min(times),
+        "time_median": statistics.median(times),
+        "peak_kb": peak / 1024,
+        "alloc_blocks": blocks,
+        "nodes": len(g.adj),
+    }
+
+
+def run_suite(sizes, names, repeat, seed=0, render_max_nodes=RENDER_MAX_NODES):
+    results = {}
+    for size in sizes:
+        nodes = len(build_venue(seed=seed, **SIZES[size]).adj)
+        for name in names:
+            factory, render = BENCHMARKS[name]
+            if render and nodes > render_max_nodes:
+                print(f"  {size:<7} {name:<24} omitido ({nodes} nodos)")
+                continue
+            r = measure(factory, size, repeat, seed)
+            results[f"{size}/{name}"] = r
+            print(f"  {size:<7} {name:<24} {r['time_median'] * 1000:10.3f} ms"
+                  f" {r['peak_kb']:10.1f} KB {r['alloc_blocks']:8d} bloques")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Lista de (prueba, métrica, base, actual) que empeoran más que threshold."""
+    regressions = []
+    for key, r in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric in ("time_median", "peak_kb"):
+            if base[metric] > 0 and r[metric] > base[metric] * (1 + threshold):
+                regressions.append((key, metric, base[metric], r[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default=",".join(SIZES))
+    parser.add_argument("--only", default=",".join(BENCHMARKS),
+                        help="pruebas separadas por comas")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--render-max-nodes", type=int, default=RENDER_MAX_NODES)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default="bench_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="empeoramiento relativo tolerado (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    sizes = [s for s in args.sizes.split(",") if s]
+    names = [n for n in args.only.split(",") if n]
+    results = run_suite(sizes, names, args.repeat, args.seed,
+                        args.render_max_nodes)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados guardados en {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Línea base guardada en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("Sin línea base: no se comparan resultados")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    for key, metric, base, now in regressions:
+        print(f"REGRESIÓN {key} {metric}: {base:.6g} -> {now:.6g} ({now / base - 1:+.0%})")
+    if not regressions:
+        print("Sin regresiones respecto a la línea base")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
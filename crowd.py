@@ -0,0 +1,241 @@
+# crowd.py
+import numpy as np
+
+# multiplicadores de tiempo por tipo de arista (igual que Graph.calculate_real_time)
+TIME_FACTORS = {"stairs": 1.5, "elevator": 0.7}
+
+
+class CrowdSimulator:
+    """
+    Simulación de multitudes por pasos de tiempo con el estado de cada
+    persona en arrays de NumPy (sin un dict por persona):
+
+    - edge[i]: arista (id del CSR) que recorre la persona i
+    - progress[i]: fracción recorrida de esa arista, en [0, 1)
+    - speed[i]: factor de velocidad (1.0 = normal)
+    - dest[i]: id del nodo destino
+    - la ruta de cada persona es un tramo de route_edges
+      (route_start[i], route_len[i]) y leg[i] es la posición actual
+
+    El tiempo de cada arista sigue a Graph.calculate_real_time:
+    peso efectivo * time_per_meter, escaleras x1.5 y ascensor x0.7.
+    tick(dt) avanza a todos a la vez con operaciones vectorizadas.
+    Los cambios del grafo se recogen en el siguiente tick: los de factores
+    (congestión por zonas, multiplicador) con weight_version y los de pesos
+    base o estructura con base_version. Si cambió la estructura se
+    reconstruyen las aristas y se traducen las rutas; quien tenía por
+    delante una arista eliminada se detiene (posición NaN).
+    """
+
+    def __init__(self, graph, time_per_meter=3.0, avoid_types=None, seed=None):
+        self.graph = graph
+        self.time_per_meter = time_per_meter
+        self.avoid_types = list(avoid_types or [])
+        self.rng = np.random.default_rng(seed)
+        self.time = 0.0
+        self._build_edges()
+
+        self.edge = np.empty(0, dtype=np.int64)
+        self.progress = np.empty(0)
+        self.speed = np.empty(0)
+        self.dest = np.empty(0, dtype=np.int64)
+        self.leg = np.empty(0, dtype=np.int64)
+        self.route_start = np.empty(0, dtype=np.int64)
+        self.route_len = np.empty(0, dtype=np.int64)
+        self.arrived = np.empty(0, dtype=bool)
+        self.route_edges = np.empty(0, dtype=np.int64)
+
+    # ----------------------------------------------------------------------
+    # ARISTAS
+    # ----------------------------------------------------------------------
+    def _build_edges(self):
+        g = self.graph
+        csr = g.csr()
+        self.csr = csr
+        self.base_version = g.base_version
+        n = csr.num_nodes()
+        self.src = np.repeat(np.arange(n), np.diff(csr.offsets))
+        self.dst = csr.targets.astype(np.int64)
+        self.refresh_times()
+
+        # (u, v) -> arista más rápida entre ambos nodos, prefiriendo los
+        # tipos permitidos
+        allowed = np.array(csr.allowed_types(self.avoid_types) or [True])[csr.types]
+        self._edge_of = {}
+        for k in np.lexsort((self.travel_time, ~allowed)):
+            self._edge_of.setdefault((int(self.src[k]), int(self.dst[k])), int(k))
+
+        pos = g.positions_3d
+        self.node_xyz = np.array([pos.get(name, (0, 0, 0)) for name in csr.names],
+                                 dtype=float).reshape(-1, 3)
+
+    def _same_structure(self, csr):
+        old = self.csr
+        return (old.names == csr.names and old.type_names == csr.type_names
+                and np.array_equal(old.offsets, csr.offsets)
+                and np.array_equal(old.targets, csr.targets)
+                and np.array_equal(old.types, csr.types))
+
+    def _sync(self):
+        """Recoge los cambios del grafo desde el último tick."""
+        g = self.graph
+        if g.base_version == self.base_version:
+            if g.weight_version != self.version:
+                self.refresh_times()
+            return
+        # pesos base o estructura nuevos: el CSR guardado ya no vale
+        csr = g.csr()
+        if self._same_structure(csr):
+            self._build_edges()
+            return
+
+        old_names, old_src, old_dst = self.csr.names, self.src, self.dst
+        self._build_edges()
+        index = self.csr.index
+        # arista antigua -> nueva (-1 si desapareció); la última entrada
+        # traduce el -1 de las personas sin arista
+        remap = np.array([self._edge_of.get((index.get(old_names[u], -1),
+                                             index.get(old_names[v], -1)), -1)
+                          for u, v in zip(old_src, old_dst)] + [-1], dtype=np.int64)
+        self.route_edges = remap[self.route_edges]
+        self.edge = remap[self.edge]
+        node_remap = np.array([index.get(name, -1) for name in old_names] + [-1],
+                              dtype=np.int64)
+        self.dest = node_remap[self.dest]
+
+        # rutas con una arista eliminada entre el tramo actual y el final
+        lost = np.concatenate([[0], np.cumsum(self.route_edges < 0)])
+        broken = (lost[self.route_start + self.route_len]
+                  - lost[self.route_start + np.minimum(self.leg, self.route_len)]) > 0
+        broken &= ~self.arrived
+        self.arrived[broken] = True
+        self.dest[broken] = -1
+        self.edge[broken] = -1
+
+    def refresh_times(self):
+        """Recalcula el tiempo de cada arista con los pesos efectivos actuales."""
+        g = self.graph
+        csr = self.csr
+        mult, node_zones, edge_zones = g.weight_factors()
+        weight = csr.weights * mult
+        if node_zones:
+            nf = np.array([node_zones.get(name, 1.0) for name in csr.names])
+            weight = weight * nf[self.src] * nf[self.dst]
+        if edge_zones:
+            ef = np.array([edge_zones.get((csr.names[u], csr.names[v]), 1.0)
+                           for u, v in zip(self.src, self.dst)])
+            weight = weight * ef
+        factor = np.array([TIME_FACTORS.get(t, 1.0) for t in csr.type_names] or [1.0])
+        self.travel_time = np.maximum(
+            weight * self.time_per_meter * factor[csr.types], 1e-9)
+        self.version = g.weight_version
+
+    # ----------------------------------------------------------------------
+    # ALTA DE PERSONAS
+    # ----------------------------------------------------------------------
+    def spawn(self, origins, destinations, speed=None):
+        """Agrega personas con origen/destino; las rutas salen de Graph.route_many."""
+        pairs = list(zip(origins, destinations))
+        unique = list(dict.fromkeys(pairs))
+        routes = self.graph.route_many(unique, self.avoid_types)
+        path_of = {pair: routes.path(k) for k, pair in enumerate(unique)}
+        return self.spawn_paths([path_of[p] for p in pairs], speed)
+
+    def spawn_paths(self, paths, speed=None):
+        """Agrega una persona por camino (lista de nodos). Devuelve sus índices."""
+        # los nombres se traducen con el CSR actual (route_many ya lo usa)
+        self._sync()
+        index = self.csr.index
+        starts, lens, dests, flat = [], [], [], []
+        offset = len(self.route_edges)
+        for path in paths:
+            ids = [index[n] for n in path]
+            edges = [self._edge_of[(u, v)] for u, v in zip(ids, ids[1:])]
+            starts.append(offset + len(flat))
+            lens.append(len(edges))
+            dests.append(ids[-1] if ids else -1)
+            flat.extend(edges)
+
+        m = len(paths)
+        if speed is None:
+            speed = self.rng.uniform(0.8, 1.2, m)
+        speed = np.broadcast_to(np.asarray(speed, dtype=float), (m,))
+        first = len(self.edge)
+
+        self.route_edges = np.concatenate([self.route_edges, np.asarray(flat, dtype=np.int64)])
+        self.route_start = np.concatenate([self.route_start, np.asarray(starts, dtype=np.int64)])
+        self.route_len = np.concatenate([self.route_len, np.asarray(lens, dtype=np.int64)])
+        self.dest = np.concatenate([self.dest, np.asarray(dests, dtype=np.int64)])
+        self.speed = np.concatenate([self.speed, speed])
+        self.leg = np.concatenate([self.leg, np.zeros(m, dtype=np.int64)])
+        self.progress = np.concatenate([self.progress, np.zeros(m)])
+        lens = np.asarray(lens, dtype=np.int64)
+        starts = np.asarray(starts, dtype=np.int64)
+        self.arrived = np.concatenate([self.arrived, lens == 0])
+        new_edges = np.full(m, -1, dtype=np.int64)
+        new_edges[lens > 0] = self.route_edges[starts[lens > 0]]
+        self.edge = np.concatenate([self.edge, new_edges])
+        return np.arange(first, first + m)
+
+    # ----------------------------------------------------------------------
+    # PASO DE SIMULACIÓN
+    # ----------------------------------------------------------------------
+    def tick(self, dt):
+        """Avanza dt segundos a todas las personas activas."""
+        self._sync()
+        self.time += dt
+        active = ~self.arrived
+        if not active.any():
+            return 0
+
+        # tiempo disponible de cada persona en este paso
+        remaining = np.zeros(len(self.edge))
+        remaining[active] = dt * self.speed[active]
+        # un tick puede cruzar varias aristas: se itera por "arista cruzada",
+        # nunca por persona
+        while True:
+            moving = active & (remaining > 0)
+            if not moving.any():
+                break
+            idx = np.nonzero(moving)[0]
+            tt = self.travel_time[self.edge[idx]]
+            left = (1.0 - self.progress[idx]) * tt  # tiempo hasta el final de la arista
+            finish = remaining[idx] >= left
+
+            stay = idx[~finish]
+            self.progress[stay] += remaining[stay] / self.travel_time[self.edge[stay]]
+            remaining[stay] = 0
+
+            done = idx[finish]
+            remaining[done] -= left[finish]
+            self.leg[done] += 1
+            self.progress[done] = 0.0
+            arrived = self.leg[done] >= self.route_len[done]
+            self.arrived[done[arrived]] = True
+            active[done[arrived]] = False
+            remaining[done[arrived]] = 0
+            go_on = done[~arrived]
+            self.edge[go_on] = self.route_edges[self.route_start[go_on] + self.leg[go_on]]
+        return int(active.sum())
+
+    # ----------------------------------------------------------------------
+    # CONSULTAS
+    # ----------------------------------------------------------------------
+    def positions(self):
+        """Array (n, 3) con la posición interpolada de cada persona."""
+        out = np.empty((len(self.edge), 3))
+        moving = ~self.arrived
+        e = self.edge[moving]
+        p = self.progress[moving][:, None]
+        out[moving] = self.node_xyz[self.src[e]] * (1 - p) + self.node_xyz[self.dst[e]] * p
+        out[~moving] = self.node_xyz[self.dest[~moving]]
+        out[self.dest < 0] = np.nan  # personas sin ruta
+        return out
+
+    def edge_load(self):
+        """Número de personas recorriendo cada arista del CSR."""
+        e = self.edge[~self.arrived]
+        return np.bincount(e, minlength=len(self.dst))
+
+    def active_count(self):
+        return int((~self.arrived).sum())
@@ -0,0 +1,240 @@
+# csr.py
+import heapq
+from array import array
+
+import numpy as np
+
+
+class CSRGraph:
+    """
+    Grafo compacto en formato CSR (Compressed Sparse Row). Graph lo usa
+    como vista para las búsquedas (from_adj) y, con compact=True, como
+    único almacenamiento tras una carga en bloque (from_edge_list o un
+    escenario .scnb).
+
+    - names / index: tabla nombre <-> id entero
+    - offsets[i]:offsets[i+1]: rango de aristas salientes del nodo i
+    - targets: id del vecino de cada arista
+    - weights: peso (float64) de cada arista
+    - types: código (uint8) del tipo de arista, ver type_names
+    """
+
+    def __init__(self, names, offsets, targets, weights, types, type_names):
+        self.names = list(names)
+        self.index = {n: i for i, n in enumerate(self.names)}
+        self.offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+        self.targets = np.ascontiguousarray(targets, dtype=np.int32)
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64)
+        self.types = np.ascontiguousarray(types, dtype=np.uint8)
+        self.type_names = list(type_names)
+
+    # ----------------------------------------------------------------------
+    # CONSTRUCCIÓN EN BLOQUE
+    # ----------------------------------------------------------------------
+    @classmethod
+    def from_adj(cls, adj):
+        """Construye el CSR desde el diccionario de adyacencia de Graph."""
+        names = list(adj)
+        index = {n: i for i, n in enumerate(names)}
+        type_names = []
+        type_codes = {}
+        m = sum(len(edges) for edges in adj.values())
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        targets = np.empty(m, dtype=np.int32)
+        weights = np.empty(m, dtype=np.float64)
+        types = np.empty(m, dtype=np.uint8)
+
+        k = 0
+        for i, a in enumerate(names):
+            for b, w, t in adj[a]:
+                code = type_codes.get(t)
+                if code is None:
+                    code = type_codes[t] = len(type_names)
+                    type_names.append(t)
+                targets[k] = index[b]
+                weights[k] = w
+                types[k] = code
+                k += 1
+            offsets[i + 1] = k
+
+        return cls(names, offsets, targets, weights, types, type_names)
+
+    @classmethod
+    def from_edge_list(cls, edges, nodes=()):
+        """
+        Construye el CSR desde aristas no dirigidas (a, b, peso, tipo) sin
+        pasar por adj: cada una da a -> b y b -> a, en el mismo orden que
+        tendría adj cargado con Graph.load_edges. nodes agrega al final los
+        nodos que no aparecen en ninguna arista.
+        """
+        index = {}
+        type_codes = {}
+        src, dst = array("q"), array("q")
+        weights, types = array("d"), array("B")
+        for a, b, w, t in edges:
+            i = index.setdefault(a, len(index))
+            j = index.setdefault(b, len(index))
+            code = type_codes.setdefault(t, len(type_codes))
+            src.extend((i, j))
+            dst.extend((j, i))
+            weights.extend((w, w))
+            types.extend((code, code))
+        for node in nodes:
+            index.setdefault(node, len(index))
+
+        n = len(index)
+        src = np.frombuffer(src, dtype=np.int64)
+        order = np.argsort(src, kind="stable")
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+        return cls(list(index), offsets,
+                   np.frombuffer(dst, dtype=np.int64)[order],
+                   np.frombuffer(weights, dtype=np.float64)[order],
+                   np.frombuffer(types, dtype=np.uint8)[order],
+                   list(type_codes))
+
+    # ----------------------------------------------------------------------
+    # CONSULTAS
+    # ----------------------------------------------------------------------
+    def num_nodes(self):
+        return len(self.names)
+
+    def num_edges(self):
+        return len(self.targets)
+
+    def allowed_types(self, avoid_types=None):
+        """Lista indexada por código de tipo: True si el tipo se puede recorrer."""
+        avoid_types = avoid_types or []
+        return [t not in avoid_types for t in self.type_names]
+
+    def set_weight(self, a, b, w):
+        """Actualiza en sitio el peso base de a -> b (O(grado de a))."""
+        i = self.index.get(a)
+        j = self.index.get(b)
+        if i is None or j is None:
+            return
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        hits = np.nonzero(self.targets[lo:hi] == j)[0]
+        self.weights[lo + hits] = w
+
+    def factor_arrays(self, node_factor=None, edge_factor=None):
+        """
+        Traduce los factores de congestión (indexados por nombre) a ids:
+        devuelve (factor por nodo, factor por (u,v)) para las búsquedas.
+        """
+        nf = {}
+        for name, f in (node_factor or {}).items():
+            i = self.index.get(name)
+            if i is not None:
+                nf[i] = f
+        ef = {}
+        for (a, b), f in (edge_factor or {}).items():
+            i, j = self.index.get(a), self.index.get(b)
+            if i is not None and j is not None:
+                ef[(i, j)] = f
+        return nf, ef
+
+    def effective_weights(self, scale=1.0, node_factor=None, edge_factor=None):
+        """Array con el peso efectivo de cada arista (mismo orden que targets)."""
+        w = self.weights * scale
+        if node_factor:
+            src = np.repeat(np.arange(self.num_nodes()), np.diff(self.offsets))
+            nf = np.ones(self.num_nodes())
+            for name, f in node_factor.items():
+                i = self.index.get(name)
+                if i is not None:
+                    nf[i] = f
+            w = w * nf[src] * nf[self.targets]
+        if edge_factor:
+            w = w.copy()
+            for (a, b), f in edge_factor.items():
+                i, j = self.index.get(a), self.index.get(b)
+                if i is None or j is None:
+                    continue
+                lo, hi = self.offsets[i], self.offsets[i + 1]
+                w[lo + np.nonzero(self.targets[lo:hi] == j)[0]] *= f
+        return w
+
+    # ----------------------------------------------------------------------
+    # DIJKSTRA SOBRE ARRAYS
+    # ----------------------------------------------------------------------
+    def sssp(self, s, avoid_types=None, scale=1.0, node_factor=None,
+             edge_factor=None, targets=None, weights=None, via=None):
+        """
+        Dijkstra desde el id s. Si se dan targets (ids), termina en cuanto
+        todos están asentados. Devuelve (dist, prev, orden de asentamiento)
+        con dist/prev indexados por id (prev[s] = -1).
+        El peso efectivo es peso * scale * factor(u) * factor(v) * factor((u,v)).
+        - weights: array float64 que sustituye a self.weights (p.ej. tiempos)
+        - via: dict opcional donde se guarda la arista (índice) que llega a cada nodo
+        Los memoryview devuelven escalares de Python sin pasar por numpy.
+        """
+        allowed = self.allowed_types(avoid_types)
+        nf, ef = self.factor_arrays(node_factor, edge_factor)
+        off = memoryview(self.offsets)
+        tgt = memoryview(self.targets)
+        wts = memoryview(np.ascontiguousarray(
+            self.weights if weights is None else weights, dtype=np.float64))
+        typ = memoryview(self.types)
+        inf = float('inf')
+        pending = set(targets) if targets is not None else None
+
+        dist = {s: 0.0}
+        prev = {s: -1}
+        order = []
+        done = set()
+        pq = [(0.0, s)]
+
+        while pq:
+            d, u = heapq.heappop(pq)
+            if u in done:
+                continue
+            done.add(u)
+            order.append(u)
+            if pending is not None:
+                pending.discard(u)
+                if not pending:
+                    break
+            fu = scale * nf.get(u, 1.0) if nf else scale
+            for k in range(off[u], off[u + 1]):
+                if not allowed[typ[k]]:
+                    continue
+                v = tgt[k]
+                w = wts[k] * fu
+                if nf:
+                    w *= nf.get(v, 1.0)
+                if ef:
+                    w *= ef.get((u, v), 1.0)
+                nd = d + w
+                if nd < dist.get(v, inf):
+                    dist[v] = nd
+                    prev[v] = u
+                    if via is not None:
+                        via[v] = k
+                    heapq.heappush(pq, (nd, v))
+
+        return dist, prev, order
+
+    def path_to(self, prev, t):
+        """Reconstruye el camino (nombres) hasta el id t a partir de prev."""
+        path = []
+        u = t
+        while u != -1:
+            path.append(self.names[u])
+            u = prev[u]
+        path.reverse()
+        return path
+
+    def dijkstra(self, start, end, avoid_types=None, scale=1.0,
+                 node_factor=None, edge_factor=None):
+        """Mismo contrato que Graph.dijkstra: devuelve (distancia, camino)."""
+        s = self.index.get(start)
+        t = self.index.get(end)
+        if s is None or t is None:
+            return float('inf'), []
+
+        dist, prev, order = self.sssp(s, avoid_types, scale, node_factor,
+                                      edge_factor, targets=(t,))
+        if not order or order[-1] != t:
+            return float('inf'), []
+        return dist[t], self.path_to(prev, t)
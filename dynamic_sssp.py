@@ -0,0 +1,165 @@
+# dynamic_sssp.py
+import heapq
+
+
+class DynamicSSSP:
+    """
+    Árbol de caminos mínimos desde un origen que se repara de forma
+    incremental (estilo Ramalingam–Reps) cuando cambian pocas aristas.
+
+    Se suscribe a los cambios del grafo y los acumula; la reparación se hace
+    al consultar (route / distance):
+    - multiplicador global: reescala las distancias, el árbol no cambia
+    - subida de peso en una arista del árbol: se invalida solo el subárbol
+      colgado de ella y se recalcula desde sus vecinos no afectados
+    - bajada de peso: se propaga desde el extremo que mejora
+    - cualquier otro cambio (estructura, pesos globales): recálculo completo
+    """
+
+    def __init__(self, graph, source, avoid_types=None):
+        self.graph = graph
+        self.source = source
+        self.avoid_types = list(avoid_types or [])
+        self._pending_arcs = set()
+        self._needs_rebuild = False
+        self.full_rebuilds = 0
+        self.repairs = 0
+        self._rebuild()
+        graph.add_listener(self._on_graph_change)
+
+    def detach(self):
+        self.graph.remove_listener(self._on_graph_change)
+
+    # ----------------------------------------------------------------------
+    # NOTIFICACIONES DEL GRAFO
+    # ----------------------------------------------------------------------
+    def _on_graph_change(self, event, arcs=None):
+        if event == "arcs":
+            self._pending_arcs.update(arcs)
+        elif event != "scale":
+            # el reescalado se detecta comparando el multiplicador al consultar
+            self._needs_rebuild = True
+
+    def _sync(self):
+        g = self.graph
+        if self._needs_rebuild or self.source not in g.adj:
+            self._rebuild()
+            return
+        if g.dynamic_multiplier != self.scale:
+            ratio = g.dynamic_multiplier / self.scale
+            for n in self.dist:
+                self.dist[n] *= ratio
+            self.scale = g.dynamic_multiplier
+        if self._pending_arcs:
+            arcs = self._pending_arcs
+            self._pending_arcs = set()
+            self._repair(arcs)
+
+    # ----------------------------------------------------------------------
+    # CÁLCULO COMPLETO
+    # ----------------------------------------------------------------------
+    def _rebuild(self):
+        self.dist = {self.source: 0}
+        self.parent = {self.source: None}
+        self.children = {}
+        self.scale = self.graph.dynamic_multiplier
+        self._needs_rebuild = False
+        self._pending_arcs = set()
+        self.full_rebuilds += 1
+        if self.source in self.graph.adj:
+            self._propagate([(0, self.source)])
+
+    def _set_parent(self, v, u):
+        old = self.parent.get(v)
+        if old is not None:
+            self.children[old].discard(v)
+        self.parent[v] = u
+        if u is not None:
+            self.children.setdefault(u, set()).add(v)
+
+    def _propagate(self, heap):
+        # Dijkstra a partir de las etiquetas ya mejoradas en heap
+        heapq.heapify(heap)
+        out_arcs = self.graph._out_arcs
+        dist = self.dist
+        inf = float('inf')
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist.get(u, inf):
+                continue
+            for v, w in out_arcs(u, self.avoid_types):
+                nd = d + w
+                if nd < dist.get(v, inf):
+                    dist[v] = nd
+                    self._set_parent(v, u)
+                    heapq.heappush(heap, (nd, v))
+
+    # ----------------------------------------------------------------------
+    # REPARACIÓN INCREMENTAL
+    # ----------------------------------------------------------------------
+    def _repair(self, arcs):
+        g = self.graph
+        inf = float('inf')
+        dist = self.dist
+        self.repairs += 1
+
+        # 1) aristas del árbol cuyo peso ya no coincide: invalidar subárbol
+        affected = set()
+        for u, v in arcs:
+            if self.parent.get(v) != u or v in affected:
+                continue
+            if dist[u] + g.arc_weight(u, v, self.avoid_types) > dist[v]:
+                stack = [v]
+                while stack:
+                    x = stack.pop()
+                    if x in affected:
+                        continue
+                    affected.add(x)
+                    stack.extend(self.children.get(x, ()))
+
+        heap = []
+        for x in affected:
+            del dist[x]
+        for x in affected:
+            self._set_parent(x, None)
+            # mejor entrada desde un nodo no afectado
+            best, best_u = inf, None
+            for u, w in g._in_arcs(x, self.avoid_types):
+                if u in dist and dist[u] + w < best:
+                    best, best_u = dist[u] + w, u
+            if best_u is not None:
+                dist[x] = best
+                self._set_parent(x, best_u)
+                heap.append((best, x))
+
+        # 2) aristas que ahora mejoran la distancia de su destino
+        for u, v in arcs:
+            if u not in dist:
+                continue
+            nd = dist[u] + g.arc_weight(u, v, self.avoid_types)
+            if nd < dist.get(v, inf):
+                dist[v] = nd
+                self._set_parent(v, u)
+                heap.append((nd, v))
+
+        self._propagate(heap)
+
+    # ----------------------------------------------------------------------
+    # CONSULTAS
+    # ----------------------------------------------------------------------
+    def distance(self, end):
+        self._sync()
+        return self.dist.get(end, float('inf'))
+
+    def route(self, end):
+        """(distancia, camino) desde el origen hasta end con el árbol reparado."""
+        self._sync()
+        if end not in self.dist:
+            return float('inf'), []
+        path = []
+        u = end
+        while u is not None:
+            path.append(u)
+            u = self.parent[u]
+        path.reverse()
+        return self.dist[end], path
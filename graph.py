@@ -1,17 +1,216 @@
 # graph.py
 import heapq
+import itertools
 import random
 import networkx as nx
-import json
+from csr import CSRGraph
+from allpairs import AllPairs
+from route_cache import RouteCache
+from dynamic_sssp import DynamicSSSP
+from hierarchy import FloorHierarchy
+import batch
+from parallel import ParallelRouter
+from traffic import TrafficAssignment
+import scenario_io
+
+
+class _FromCSR:
+    # atributo de Graph que, mientras el grafo vive solo como CSR (escenario
+    # .scnb o carga en bloque con compact=True), se construye desde él la
+    # primera vez que algo lo usa (ver Graph._load_csr)
+    def __set_name__(self, owner, name):
+        self.key = "_stored" + name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        if obj._lazy_csr is not None:
+            obj._materialize()
+        return obj.__dict__[self.key]
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.key] = value
+
 
 class Graph:
-    def __init__(self):
+    adj = _FromCSR()
+    original_weights = _FromCSR()
+    _edge_index = _FromCSR()
+    _edge_pos = _FromCSR()
+    _floor_edges = _FromCSR()
+
+    def __init__(self, compact=False, cache_size=256):
+        # CSR aún no volcado a adj (None = adj al día), ver _load_csr
+        self._lazy_csr = None
         # adjacency: node -> list of [neighbor, weight, type]
         self.adj = {}
         self.positions_3d = {}  # node -> (x,y,floor)
+        # índice por piso: z -> conjunto de nodos y z -> aristas (a, b) con a < b
+        # y ambos extremos en ese piso (se mantienen con _place/_unplace,
+        # _append_slot y _drop_slots)
+        self._floor_nodes = {}
+        self._floor_edges = {}
         self.original_weights = {}  # (a,b) -> w
         self.dynamic_multiplier = 1.0
         self.congestion_zones = {}
+        # Los registros de adj guardan el peso BASE; el peso efectivo se calcula
+        # al leer: base * multiplicador * zona(a) * zona(b) * zona((a,b)).
+        # Las zonas se separan por tipo para no recorrer congestion_zones.
+        self._node_zones = {}  # nodo -> factor
+        self._edge_zones = {}  # (a,b) -> factor
+        # se incrementa con cualquier cambio que afecte a las rutas
+        self.weight_version = 0
+        # igual que weight_version pero sin contar el multiplicador global
+        # (las cotas que escalan con el multiplicador dependen solo de esta)
+        self.base_version = 0
+        self._astar_tables = None
+        self.last_expanded = 0  # nodos expandidos por la última búsqueda
+        # matrices de todos los pares (opcionales): avoid -> (AllPairs, workers)
+        self._all_pairs = {}
+        # caché LRU de dijkstra / k_shortest_paths
+        # clave: (start, end, frozenset(avoid_types), k, weight_version)
+        self.route_cache = RouteCache(cache_size)
+        # observadores de cambios: fn(evento, aristas)
+        #   "arcs": cambió el peso de las aristas dirigidas dadas
+        #   "scale": cambió solo el multiplicador global
+        #   "reset": cambio estructural o de muchos pesos a la vez
+        self._listeners = []
+        self._tree = None  # árbol dinámico de la última consulta incremental
+        self._hierarchy = None  # enrutamiento jerárquico por pisos (perezoso)
+        # vista CSR (arrays) para enrutar; se reconstruye en bloque la próxima
+        # vez que se consulta después de cualquier edición. compact=True
+        # enruta sobre los arrays y hace del CSR el único almacenamiento tras
+        # una carga en bloque (load_edges sobre un grafo vacío): adj y sus
+        # índices se construyen recién con la primera edición o algoritmo
+        # que los necesite
+        self.compact = compact
+        self._csr = None
+        # índice de aristas: (a,b) -> lista de registros [b, w, t] dentro de adj[a]
+        # (lista porque se admiten aristas paralelas entre el mismo par)
+        self._edge_index = {}
+        # posición de cada uno de esos registros dentro de adj[a] (mismo orden),
+        # para quitar aristas con swap-remove en O(1) sin recorrer la lista.
+        # adj es simétrico: los vecinos de entrada de n son los de adj[n]
+        self._edge_pos = {}
+
+    # ----------------------------------------------------------------------
+    # VISTA COMPACTA (CSR)
+    # ----------------------------------------------------------------------
+    def csr(self):
+        """
+        Devuelve la vista CSR del grafo (ids enteros, arrays de destinos,
+        pesos float64 y tipos uint8). Se reconstruye en bloque si hubo cambios.
+        """
+        if self._csr is None:
+            self._csr = CSRGraph.from_adj(self.adj)
+        return self._csr
+
+    def _mark_dirty(self):
+        # cualquier edición estructural invalida la vista compacta
+        self._csr = None
+        self.weight_version += 1
+        self.base_version += 1
+        self._notify("reset")
+
+    def _weights_changed(self, scale_only=False, arcs=None):
+        # cambio de factores: la estructura (y el CSR) siguen siendo válidos
+        self.weight_version += 1
+        if scale_only:
+            self._notify("scale")
+            return
+        self.base_version += 1
+        if arcs is not None:
+            self._notify("arcs", arcs)
+        else:
+            self._notify("reset")
+
+    # ----------------------------------------------------------------------
+    # OBSERVADORES
+    # ----------------------------------------------------------------------
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn):
+        if fn in self._listeners:
+            self._listeners.remove(fn)
+
+    def _notify(self, event, arcs=None):
+        for fn in list(self._listeners):
+            fn(event, arcs)
+
+    def _incident_arcs(self, node):
+        # aristas dirigidas que entran y salen de node (O(grado))
+        arcs = set()
+        for b, _, _ in self.adj.get(node, []):
+            arcs.add((node, b))
+            arcs.add((b, node))
+        return arcs
+
+    # ----------------------------------------------------------------------
+    # ÍNDICE DE ARISTAS
+    # ----------------------------------------------------------------------
+    def edge_slots(self, a, b):
+        """Registros [b, w, t] de la arista a -> b en O(1) (lista vacía si no existe)."""
+        return self._edge_index.get((a, b), ())
+
+    def get_edge(self, a, b):
+        """Primer registro [b, w, t] de la arista a -> b, o None."""
+        slots = self._edge_index.get((a, b))
+        return slots[0] if slots else None
+
+    def _append_slot(self, a, edge):
+        # agrega el registro edge = [b, w, t] al final de adj[a] y lo indexa
+        edges = self.adj.setdefault(a, [])
+        key = (a, edge[0])
+        self._edge_index.setdefault(key, []).append(edge)
+        self._edge_pos.setdefault(key, []).append(len(edges))
+        edges.append(edge)
+        pa, pb = self.positions_3d.get(a), self.positions_3d.get(edge[0])
+        if pa is not None and pb is not None and pa[2] == pb[2] and a != edge[0]:
+            self._floor_edges.setdefault(pa[2], set()).add(
+                (a, edge[0]) if a < edge[0] else (edge[0], a))
+
+    def _drop_slots(self, a, b):
+        # quita todos los registros a -> b de adj[a]: cada hueco se rellena
+        # con el último registro de la lista (O(1) por registro)
+        self._edge_index.pop((a, b), None)
+        positions = self._edge_pos.pop((a, b), None)
+        if not positions:
+            return
+        pos = self.positions_3d.get(a)
+        if pos is not None and pos[2] in self._floor_edges:
+            self._floor_edges[pos[2]].discard((a, b) if a < b else (b, a))
+        edges = self.adj[a]
+        # de mayor a menor: el último nunca es uno de los que faltan quitar
+        for i in sorted(positions, reverse=True):
+            last = edges.pop()
+            if i < len(edges):
+                edges[i] = last
+                moved = self._edge_pos[(a, last[0])]
+                moved[moved.index(len(edges))] = i
+
+    # ----------------------------------------------------------------------
+    # PESO EFECTIVO
+    # ----------------------------------------------------------------------
+    def effective_weight(self, a, b, w):
+        """Peso efectivo de la arista a -> b cuyo peso base es w."""
+        m = self.dynamic_multiplier
+        if self._node_zones:
+            m *= self._node_zones.get(a, 1.0) * self._node_zones.get(b, 1.0)
+        if self._edge_zones:
+            m *= self._edge_zones.get((a, b), 1.0)
+        return w * m
+
+    def weight_factors(self):
+        """(multiplicador, zonas por nodo, zonas por arista) para copiar a otros motores."""
+        return self.dynamic_multiplier, dict(self._node_zones), dict(self._edge_zones)
+
+    def edge_weight(self, a, b):
+        """Peso efectivo actual de la arista a -> b, o None si no existe."""
+        edge = self.get_edge(a, b)
+        if edge is None:
+            return None
+        return self.effective_weight(a, b, edge[1])
 
     def set_zone_congestion(self, node_or_edge, factor):
         """
@@ -19,34 +218,160 @@ class Graph:
         factor: multiplicador adicional (1.0 = sin cambio, >1 = más pesado)
         """
         self.congestion_zones[node_or_edge] = factor
-        self.apply_congestion()
+        if isinstance(node_or_edge, tuple):
+            self._edge_zones[node_or_edge] = factor
+            arcs = {node_or_edge}
+        else:
+            self._node_zones[node_or_edge] = factor
+            arcs = self._incident_arcs(node_or_edge)
+        self._weights_changed(arcs=arcs)
 
     def apply_congestion(self):
-        # Reaplicar pesos dinámicos con zonas de congestión
-        for (a,b), w in self.original_weights.items():
-            multiplier = self.dynamic_multiplier
-            # revisar si a o b tienen congestión por zona
-            multiplier *= self.congestion_zones.get(a, 1.0)
-            multiplier *= self.congestion_zones.get(b, 1.0)
-            # revisar si la arista (a,b) tiene factor de congestión específico
-            multiplier *= self.congestion_zones.get((a,b), 1.0)
-            for edge in self.adj[a]:
-                if edge[0] == b:
-                    edge[1] = w * multiplier
+        # Los pesos efectivos se calculan al leerlos: basta con invalidar
+        # las cachés que dependan de la versión de pesos
+        self._weights_changed()
     # ----------------------------------------------------------------------
     # AGREGAR ARISTA
     # ----------------------------------------------------------------------
     def add_edge(self, a, b, w, edge_type="normal"):
-        self.adj.setdefault(a, []).append([b, w, edge_type])
-        self.adj.setdefault(b, []).append([a, w, edge_type])
+        self._append_slot(a, [b, w, edge_type])
+        self._append_slot(b, [a, w, edge_type])
         self.original_weights[(a, b)] = w
         self.original_weights[(b, a)] = w
+        self._mark_dirty()
+
+    def load_edges(self, edges, positions=None):
+        """
+        Carga en bloque aristas no dirigidas (a, b, peso, tipo) y posiciones
+        {nodo: (x, y, z)}. Equivale a add_edge / set_position repetidos pero
+        invalida el CSR y notifica a los observadores una sola vez.
+        Los nodos con posición y sin aristas quedan como nodos aislados.
+        Con compact=True y el grafo vacío las aristas van directo al CSR,
+        sin construir adj.
+        """
+        if (self.compact and self._lazy_csr is None and not self.adj
+                and not self.positions_3d):
+            positions = {node: tuple(pos) for node, pos in (positions or {}).items()}
+            self._load_csr(CSRGraph.from_edge_list(edges, positions), positions)
+            return
+        append = self._append_slot
+        orig = self.original_weights
+        for a, b, w, edge_type in edges:
+            append(a, [b, w, edge_type])
+            append(b, [a, w, edge_type])
+            orig[(a, b)] = w
+            orig[(b, a)] = w
+        if positions:
+            for node, pos in positions.items():
+                self._place(node, tuple(pos))
+                self.adj.setdefault(node, [])
+        self._mark_dirty()
+
+    def _load_csr(self, csr, positions):
+        # adopta el CSR (de un .scnb mapeado en memoria o de load_edges con
+        # compact=True) como único almacenamiento. adj, los índices de
+        # aristas y los pesos originales se vuelcan desde él en el primer
+        # acceso (_materialize): enrutar con compact=True, guardar en .scnb
+        # o consultar posiciones y pisos no los necesitan
+        self.positions_3d = positions
+        floors = self._floor_nodes
+        for node, pos in positions.items():
+            floors.setdefault(pos[2], set()).add(node)
+        self._mark_dirty()
+        self._csr = csr
+        self._lazy_csr = csr
+
+    def _has_node(self, name):
+        # pertenencia sin volcar un escenario binario pendiente
+        if self._lazy_csr is not None:
+            return name in self._lazy_csr.index
+        return name in self.adj
+
+    def _materialize(self):
+        # reconstruye adj desde el CSR pendiente (registro k de adj[a] =
+        # arista offsets[a] + k), con sus índices
+        csr = self._lazy_csr
+        self._lazy_csr = None
+        names = csr.names
+        targets = [names[j] for j in csr.targets.tolist()]
+        weights = csr.weights.tolist()
+        types = [csr.type_names[c] for c in csr.types.tolist()]
+        offsets = csr.offsets.tolist()
+        index = self._edge_index
+        pos = self._edge_pos
+        orig = self.original_weights
+        for i, a in enumerate(names):
+            edges = [[targets[k], weights[k], types[k]]
+                     for k in range(offsets[i], offsets[i + 1])]
+            self.adj[a] = edges
+            for j, edge in enumerate(edges):
+                index.setdefault((a, edge[0]), []).append(edge)
+                pos.setdefault((a, edge[0]), []).append(j)
+                orig[(a, edge[0])] = edge[1]
+        # aristas dentro de cada piso
+        positions = self.positions_3d
+        floor_edges = self._floor_edges
+        for a, edges in self.adj.items():
+            pa = positions.get(a)
+            if pa is None:
+                continue
+            for b, _, _ in edges:
+                if a < b and positions.get(b, (None,) * 3)[2] == pa[2]:
+                    floor_edges.setdefault(pa[2], set()).add((a, b))
 
     # ----------------------------------------------------------------------
     # POSICIONES
     # ----------------------------------------------------------------------
+    def _place(self, node, pos):
+        # fija la posición de node y mantiene el índice por piso (nodos y
+        # aristas hacia vecinos del mismo piso): O(grado)
+        self._unplace(node)
+        self.positions_3d[node] = pos
+        z = pos[2]
+        self._floor_nodes.setdefault(z, set()).add(node)
+        same = [b for b, _, _ in self.adj.get(node, ())
+                if b != node and self.positions_3d.get(b, (None,) * 3)[2] == z]
+        if same:
+            self._floor_edges.setdefault(z, set()).update(
+                (node, b) if node < b else (b, node) for b in same)
+
+    def _unplace(self, node):
+        old = self.positions_3d.pop(node, None)
+        if old is None:
+            return
+        z = old[2]
+        nodes = self._floor_nodes[z]
+        nodes.discard(node)
+        if not nodes:
+            del self._floor_nodes[z]
+        edges = self._floor_edges.get(z)
+        if edges:
+            for b, _, _ in self.adj.get(node, ()):
+                edges.discard((node, b) if node < b else (b, node))
+            if not edges:
+                del self._floor_edges[z]
+
+    def floor_levels(self):
+        """Valores z con algún nodo, de abajo hacia arriba (piso 1, 2, ...)."""
+        return sorted(self._floor_nodes)
+
+    def floor_z(self, floor):
+        """Valor z del piso número floor (1 = el más bajo), o None si no existe."""
+        levels = self.floor_levels()
+        return levels[floor - 1] if 1 <= floor <= len(levels) else None
+
+    def floor_nodes(self, z):
+        """Conjunto (de solo lectura) de los nodos con altura z."""
+        return self._floor_nodes.get(z, frozenset())
+
+    def floor_edges(self, z):
+        """Conjunto (de solo lectura) de pares (a, b), a < b, de aristas dentro del piso z."""
+        return self._floor_edges.get(z, frozenset())
+
     def set_position(self, node, x, y, floor):
-        self.positions_3d[node] = (x, y, floor)
+        self._place(node, (x, y, floor))
+        # el piso de un nodo cambia portales y cotas de A*
+        self._mark_dirty()
 
     def nodes(self):
         return list(self.positions_3d.keys())
@@ -55,11 +380,10 @@ class Graph:
     # PESOS DINÁMICOS
     # ----------------------------------------------------------------------
     def set_dynamic_multiplier(self, mult: float):
+        # O(1): el multiplicador se aplica al leer el peso
         self.dynamic_multiplier = max(0.1, float(mult))
-        for (a,b), w in self.original_weights.items():
-            for edge in self.adj[a]:
-                if edge[0] == b:
-                    edge[1] = w * self.dynamic_multiplier
+        self._weights_changed(scale_only=True)
+
     def randomize_specific_congestion(self, nodes):
         for node in nodes:
             factor = random.uniform(1.5, 3.0)  # congestión aleatoria
@@ -68,24 +392,28 @@ class Graph:
     def randomize_congestion(self, extra_min=1, extra_max=8):
         for (a,b), w in self.original_weights.items():
             extra = random.randint(extra_min, extra_max)
-            for edge in self.adj[a]:
-                if edge[0] == b:
-                    edge[1] = (w + extra) * self.dynamic_multiplier
+            for edge in self.edge_slots(a, b):
+                edge[1] = w + extra
+        self._mark_dirty()
 
     def restore_original(self):
         for (a,b), w in self.original_weights.items():
-            for edge in self.adj[a]:
-                if edge[0] == b:
-                    edge[1] = w * self.dynamic_multiplier
+            for edge in self.edge_slots(a, b):
+                edge[1] = w
+        # los pesos originales no incluyen congestión por zonas
+        self.congestion_zones = {}
+        self._node_zones = {}
+        self._edge_zones = {}
+        self._mark_dirty()
+
     def set_edge_weight(self, a, b, new_weight):
         # actualizar arista a -> b
-        for edge in self.adj[a]:
-            if edge[0] == b:
-                edge[1] = new_weight
+        for edge in self.edge_slots(a, b):
+            edge[1] = new_weight
         # actualizar arista b -> a
-        for edge in self.adj[b]:
-            if edge[0] == a:
-                edge[1] = new_weight
+        for edge in self.edge_slots(b, a):
+            edge[1] = new_weight
+        self._set_csr_weight(a, b, new_weight)
     
     # ----------------------------------------------------------------------
     # Prueba de nodos y aristas
@@ -115,90 +443,116 @@ class Graph:
             new_weight = float(self.original_weights[(a, b)]) + float(value)
 
         # actualizar a -> b
-        for edge in self.adj.get(a, []):
-            if edge[0] == b:
-                edge[1] = new_weight
+        for edge in self.edge_slots(a, b):
+            edge[1] = new_weight
 
         # actualizar b -> a (grafo no dirigido)
-        for edge in self.adj.get(b, []):
-            if edge[0] == a:
-                edge[1] = new_weight
+        for edge in self.edge_slots(b, a):
+            edge[1] = new_weight
 
+        self._set_csr_weight(a, b, new_weight)
         return True
 
+    def _set_csr_weight(self, a, b, new_weight):
+        # actualiza el peso base a<->b en el CSR vivo (O(grado)) sin reconstruirlo
+        if self._csr is not None:
+            self._csr.set_weight(a, b, new_weight)
+            self._csr.set_weight(b, a, new_weight)
+        self._weights_changed(arcs={(a, b), (b, a)})
+
     def add_node(self, name, pos=(0,0,0)):
         if name in self.adj:
             return False  # nodo ya existe
         self.adj[name] = []
-        self.positions_3d[name] = pos
+        self._place(name, pos)
+        self._mark_dirty()
         return True
 
     def remove_node(self, name):
         if name not in self.adj:
             return False
-        # eliminar todas las aristas que apuntan a este nodo
-        for neighbor, edges in self.adj.items():
-            self.adj[neighbor] = [e for e in edges if e[0] != name]
-        # eliminar nodo y posición
-        del self.adj[name]
-        if name in self.positions_3d:
-            del self.positions_3d[name]
-        # eliminar pesos originales asociados
-        keys_to_delete = [k for k in self.original_weights if name in k]
-        for k in keys_to_delete:
-            del self.original_weights[k]
+        self.remove_nodes([name])
         return True
 
+    def remove_nodes(self, names):
+        """
+        Elimina un conjunto de nodos (p.ej. el ala de un piso) en una sola
+        operación: O(suma de grados) y una única invalidación.
+        Devuelve cuántos nodos se eliminaron.
+        """
+        names = {n for n in names if n in self.adj}
+        for name in names:
+            # solo los vecinos de name tienen aristas hacia name
+            for b in {e[0] for e in self.adj[name]}:
+                if b not in names:
+                    self._drop_slots(b, name)
+                self._edge_index.pop((name, b), None)
+                self._edge_pos.pop((name, b), None)
+                self.original_weights.pop((name, b), None)
+                self.original_weights.pop((b, name), None)
+        for name in names:
+            # eliminar posición (con sus aristas del índice por piso) y nodo
+            self._unplace(name)
+            del self.adj[name]
+        if names:
+            self._mark_dirty()
+        return len(names)
+
     def remove_edge(self, a, b):
         if a in self.adj:
-            self.adj[a] = [e for e in self.adj[a] if e[0] != b]
+            self._drop_slots(a, b)
         if b in self.adj:
-            self.adj[b] = [e for e in self.adj[b] if e[0] != a]
+            self._drop_slots(b, a)
         self.original_weights.pop((a,b), None)
         self.original_weights.pop((b,a), None)
+        self._mark_dirty()
 
     # ==========================================================
     # GUARDAR Y CARGAR ESCENARIOS EN JSON
     # ==========================================================
-    def save_scenario(self, filename):
-        data = {
-            "positions": self.positions_3d,  # {nodo: [x,y,z]}
-            "edges": [],  # lista de aristas
-        }
-
-        for a in self.adj:
-            for b, w, t in self.adj[a]:
-                # para evitar duplicados: solo guarda a < b
-                if a < b:
-                    data["edges"].append({
-                        "start": a,
-                        "end": b,
-                        "weight": w,
-                        "type": t
-                    })
-        
-        with open(filename, "w") as f:
-            json.dump(data, f, indent=4)
+    def save_scenario(self, filename, generation=None):
+        # .scnb: formato binario mapeado en memoria (ver scenario_io).
+        # generation: identificador opcional del snapshot (EditJournal)
+        if scenario_io.is_binary(filename):
+            scenario_io.write_binary(self, filename, generation)
+        else:
+            # se escribe en streaming desde adj: {"positions": {nodo: [x,y,z]},
+            # "edges": [{"start", "end", "weight", "type"}]} con cada arista una vez
+            scenario_io.write_scenario(self, filename, generation)
         print(f"Escenario guardado en {filename}")
 
 
     def load_scenario(self, filename):
-        with open(filename, "r") as f:
-            data = json.load(f)
-        
         # limpiar grafo actual
+        self._lazy_csr = None
         self.adj = {}
         self.positions_3d = {}
+        self._floor_nodes = {}
+        self._floor_edges = {}
         self.original_weights = {}
-
-        # restaurar posiciones
-        self.positions_3d = {k: tuple(v) for k,v in data.get("positions", {}).items()}
-
-        # restaurar aristas
-        for edge in data.get("edges", []):
-            a, b = edge["start"], edge["end"]
-            w, t = edge["weight"], edge["type"]
-            self.add_edge(a, b, w, t)
+        self._edge_index = {}
+        self._edge_pos = {}
+        self.congestion_zones = {}
+        self._node_zones = {}
+        self._edge_zones = {}
+
+        if scenario_io.is_binary(filename):
+            self._load_csr(*scenario_io.read_binary(filename))
+            print(f"Escenario cargado desde {filename}")
+            return
+
+        # el archivo se lee en streaming (memoria acotada) y las aristas
+        # entran en bloque; las posiciones se aplican al final de la carga
+        positions = {}
+
+        def edges():
+            for kind, item, pos in scenario_io.iter_scenario(filename):
+                if kind == "position":
+                    positions[item] = pos
+                else:
+                    yield item["start"], item["end"], item["weight"], item["type"]
+
+        self.load_edges(edges(), positions)
         
         print(f"Escenario cargado desde {filename}")
     # ----------------------------------------------------------------------
@@ -214,81 +568,529 @@ class Graph:
         Dijkstra que permite evitar ciertos tipos de aristas.
         avoid_types: lista de strings, p.ej ["stairs", "elevator"]
         """
-        if start not in self.adj or end not in self.adj:
+        if not self._has_node(start) or not self._has_node(end):
             return float('inf'), []
 
-        avoid_types = avoid_types or []
+        key = self._cache_key(start, end, avoid_types, 1)
+        cached = self.route_cache.get(key, self.weight_version)
+        if cached is not None:
+            self.last_expanded = 0
+            return cached[0], list(cached[1])
 
-        dist = {n: float('inf') for n in self.adj}
-        prev = {n: None for n in self.adj}
-        dist[start] = 0
-        pq = [(0, start)]
+        if self.compact:
+            mult, node_zones, edge_zones = self.weight_factors()
+            dist, path = self.csr().dijkstra(start, end, avoid_types, mult,
+                                             node_zones, edge_zones)
+        else:
+            dist, path, self.last_expanded = self._search(start, end, avoid_types)
+        self.route_cache.put(key, self.weight_version, (dist, tuple(path)))
+        return dist, path
+
+    def _cache_key(self, start, end, avoid_types, k):
+        return (start, end, frozenset(avoid_types or []), k, self.weight_version)
+
+    def _search(self, start, end, avoid_types=None, banned_nodes=(),
+                banned_edges=(), heuristic=None):
+        """
+        Búsqueda de camino mínimo sobre adj que NO modifica el grafo.
+
+        - banned_nodes: nodos que no se pueden visitar
+        - banned_edges: aristas (a,b) que no se pueden recorrer
+        - heuristic: función nodo -> cota inferior del coste hasta end (A*);
+          si devuelve inf el nodo no puede llegar a end y se descarta
+        Devuelve (distancia, camino, nodos expandidos).
+        """
+        if start not in self.adj or end not in self.adj or start in banned_nodes:
+            return float('inf'), [], 0
+
+        avoid_types = avoid_types or []
+        mult = self.dynamic_multiplier
+        node_zones = self._node_zones
+        edge_zones = self._edge_zones
+        inf = float('inf')
+
+        dist = {start: 0}
+        prev = {start: None}
+        closed = set()
+        h0 = heuristic(start) if heuristic else 0
+        pq = [(h0, 0, start)]
+        expanded = 0
 
         while pq:
-            d, u = heapq.heappop(pq)
-            if d > dist[u]:
+            _, d, u = heapq.heappop(pq)
+            if u in closed or d > dist[u]:
                 continue
+            closed.add(u)
+            expanded += 1
             if u == end:
                 break
 
+            # factor común a todas las aristas que salen de u
+            fu = mult * node_zones.get(u, 1.0) if node_zones else mult
             for v, w, t in self.adj.get(u, []):
                 if t in avoid_types:
                     continue  # ignorar este tipo de arista
+                if v in banned_nodes or v in closed:
+                    continue
+                if banned_edges and (u, v) in banned_edges:
+                    continue
+                w = w * fu
+                if node_zones:
+                    w *= node_zones.get(v, 1.0)
+                if edge_zones:
+                    w *= edge_zones.get((u, v), 1.0)
                 nd = d + w
-                if nd < dist[v]:
+                if nd < dist.get(v, inf):
+                    h = heuristic(v) if heuristic else 0
+                    if h == inf:
+                        continue
                     dist[v] = nd
                     prev[v] = u
-                    heapq.heappush(pq, (nd, v))
+                    heapq.heappush(pq, (nd + h, nd, v))
+
+        if end not in closed:
+            return inf, [], expanded
 
         # reconstruir camino
         path = []
         u = end
         while u is not None:
-            path.insert(0, u)
+            path.append(u)
             u = prev[u]
+        path.reverse()
+        return dist[end], path, expanded
 
-        if path and path[0] == start:
-            return dist[end], path
-        else:
+    def _distances_to(self, end, avoid_types=None):
+        """
+        Árbol de caminos mínimos invertido hacia end (Dijkstra sobre las
+        aristas entrantes). Devuelve (coste hasta end, siguiente nodo).
+        """
+        avoid_types = avoid_types or []
+        dist = {end: 0}
+        succ = {end: None}
+        pq = [(0, end)]
+        while pq:
+            d, v = heapq.heappop(pq)
+            if d > dist[v]:
+                continue
+            for u, w in self._in_arcs(v, avoid_types):
+                nd = d + w
+                if nd < dist.get(u, float('inf')):
+                    dist[u] = nd
+                    succ[u] = v
+                    heapq.heappush(pq, (nd, u))
+        return dist, succ
+
+    def _in_arcs(self, v, avoid_types):
+        # aristas u -> v con su peso efectivo (puede ser distinto de v -> u)
+        for u in {e[0] for e in self.adj.get(v, [])}:
+            for _, w, t in self.edge_slots(u, v):
+                if t not in avoid_types:
+                    yield u, self.effective_weight(u, v, w)
+
+    def _out_arcs(self, u, avoid_types):
+        # aristas u -> v con su peso efectivo
+        for v, w, t in self.adj.get(u, []):
+            if t not in avoid_types:
+                yield v, self.effective_weight(u, v, w)
+
+    # ----------------------------------------------------------------------
+    # DIJKSTRA BIDIRECCIONAL
+    # ----------------------------------------------------------------------
+    def bidirectional_dijkstra(self, start, end, avoid_types=None):
+        """
+        Dijkstra simultáneo desde start (aristas salientes) y desde end
+        (aristas entrantes). Se detiene cuando la suma de los mínimos de ambas
+        colas alcanza el mejor camino encontrado. Mismo contrato que dijkstra.
+        """
+        if start not in self.adj or end not in self.adj:
             return float('inf'), []
+        if start == end:
+            self.last_expanded = 1
+            return 0, [start]
 
+        avoid_types = avoid_types or []
+        inf = float('inf')
+        # índice 0 = búsqueda hacia adelante, 1 = hacia atrás
+        dist = ({start: 0}, {end: 0})
+        parent = ({start: None}, {end: None})
+        done = (set(), set())
+        queues = ([(0, start)], [(0, end)])
+        arcs = (self._out_arcs, self._in_arcs)
+        best, meet = inf, None
+        expanded = 0
+
+        while queues[0] and queues[1]:
+            if queues[0][0][0] + queues[1][0][0] >= best:
+                break
+            # expandir el lado con la cola más barata
+            side = 0 if queues[0][0][0] <= queues[1][0][0] else 1
+            d, u = heapq.heappop(queues[side])
+            if u in done[side]:
+                continue
+            done[side].add(u)
+            expanded += 1
+            other = dist[1 - side]
+            for v, w in arcs[side](u, avoid_types):
+                nd = d + w
+                if nd < dist[side].get(v, inf):
+                    dist[side][v] = nd
+                    parent[side][v] = u
+                    heapq.heappush(queues[side], (nd, v))
+                if v in other and nd + other[v] < best:
+                    best, meet = nd + other[v], v
+            if u in other and d + other[u] < best:
+                best, meet = d + other[u], u
+
+        self.last_expanded = expanded
+        if meet is None:
+            return inf, []
+
+        path = []
+        u = meet
+        while u is not None:
+            path.append(u)
+            u = parent[0][u]
+        path.reverse()
+        u = parent[1][meet]
+        while u is not None:
+            path.append(u)
+            u = parent[1][u]
+        return best, path
+
+    # ----------------------------------------------------------------------
+    # ENRUTAMIENTO JERÁRQUICO POR PISOS
+    # ----------------------------------------------------------------------
+    def hierarchy(self):
+        """Grafo de portales entre pisos (se crea la primera vez que se usa)."""
+        if self._hierarchy is None:
+            self._hierarchy = FloorHierarchy(self)
+        return self._hierarchy
+
+    def hierarchical_route(self, start, end, avoid_types=None):
+        """
+        Ruta entre pisos usando el grafo de portales: solo se exploran
+        completos los pisos de origen y destino. Mismo contrato que dijkstra.
+        """
+        return self.hierarchy().route(start, end, avoid_types)
+
+    ALGORITHMS = ("dijkstra", "astar", "bidirectional", "hierarchical")
+
+    def shortest_path(self, start, end, avoid_types=None, algorithm="dijkstra"):
+        """
+        Camino mínimo con el algoritmo elegido: "dijkstra", "astar",
+        "bidirectional" o "hierarchical". Todos devuelven (distancia, camino).
+        """
+        if algorithm == "astar":
+            return self.astar(start, end, avoid_types)
+        if algorithm == "bidirectional":
+            return self.bidirectional_dijkstra(start, end, avoid_types)
+        if algorithm == "hierarchical":
+            return self.hierarchical_route(start, end, avoid_types)
+        if algorithm == "dijkstra":
+            return self.dijkstra(start, end, avoid_types)
+        raise ValueError(f"Algoritmo desconocido: {algorithm}")
+
+    def arc_weight(self, a, b, avoid_types=None):
+        """Peso efectivo de a -> b (aristas paralelas: la más barata permitida)."""
+        avoid_types = avoid_types or []
+        return min((self.effective_weight(a, b, w)
+                    for _, w, t in self.edge_slots(a, b) if t not in avoid_types),
+                   default=float('inf'))
+
+    def path_cost(self, path, avoid_types=None):
+        """Coste efectivo de un camino."""
+        return sum(self.arc_weight(a, b, avoid_types) for a, b in zip(path, path[1:]))
+
+    def iter_shortest_paths(self, start, end, avoid_types=None, algorithm="dijkstra"):
+        """
+        Generador perezoso de rutas simples (sin ciclos) de start a end en
+        orden creciente de coste, con el algoritmo de Yen.
+
+        La primera ruta se calcula con `algorithm` (ver shortest_path). No
+        modifica el grafo: las desviaciones se buscan con máscaras de
+        nodos/aristas prohibidos. El árbol invertido hacia end se calcula una
+        vez (al pedir la segunda ruta) y se reutiliza en cada desviación: si
+        su rama no toca la máscara es directamente el mejor desvío; si no,
+        sirve de heurística exacta para un A* acotado.
+        """
+        _, best = self.shortest_path(start, end, avoid_types, algorithm)
+        if not best:
+            return
+        found = [best]
+        yield best
+
+        to_end, succ = self._distances_to(end, avoid_types)
+        inf = float('inf')
+
+        def heuristic(n):
+            return to_end.get(n, inf)
+
+        def tree_branch(n):
+            branch = [n]
+            while branch[-1] != end:
+                branch.append(succ[branch[-1]])
+            return branch
+
+        candidates = []  # heap (coste, contador, camino)
+        seen = {tuple(best)}
+        counter = 0
+        while True:
+            last = found[-1]
+            # coste acumulado de cada prefijo (raíz) de la última ruta
+            root_cost = [0]
+            for a, b in zip(last, last[1:]):
+                root_cost.append(root_cost[-1] + self.path_cost([a, b], avoid_types))
+
+            for i in range(len(last) - 1):
+                spur = last[i]
+                root = last[:i + 1]
+                banned_nodes = set(root[:-1])
+                banned_edges = {(p[i], p[i + 1]) for p in found
+                                if len(p) > i + 1 and p[:i + 1] == root}
+
+                branch = tree_branch(spur)
+                if (branch[0], branch[1]) not in banned_edges and \
+                        banned_nodes.isdisjoint(branch):
+                    spur_cost, spur_path = to_end[spur], branch
+                else:
+                    spur_cost, spur_path, _ = self._search(
+                        spur, end, avoid_types, banned_nodes, banned_edges, heuristic)
+                    if not spur_path:
+                        continue
+
+                path = root[:-1] + spur_path
+                key = tuple(path)
+                if key in seen:
+                    continue
+                seen.add(key)
+                counter += 1
+                heapq.heappush(candidates, (root_cost[i] + spur_cost, counter, path))
+
+            if not candidates:
+                return
+            _, _, path = heapq.heappop(candidates)
+            found.append(path)
+            yield path
 
     def k_shortest_paths(self, start, end, k=3, avoid_types=None):
         """
-        Calcula k rutas más cortas usando Dijkstra repetido.
+        Calcula las k rutas simples más cortas (Yen) sin modificar el grafo.
         Evita tipos de aristas según avoid_types.
         """
-        avoid_types = avoid_types or []
-        all_paths = []
-        backup_removed = []
-
-        # crear copia temporal de las aristas
-        def temporarily_remove_edge(a, b):
-            edge_a = next((e for e in self.adj[a] if e[0] == b), None)
-            edge_b = next((e for e in self.adj[b] if e[0] == a), None)
-            if edge_a and edge_b:
-                self.adj[a].remove(edge_a)
-                self.adj[b].remove(edge_b)
-                backup_removed.append((a, b, edge_a, edge_b))
-
-        for i in range(k):
-            _, path = self.dijkstra(start, end, avoid_types=avoid_types)
-            if not path:
-                break
+        key = self._cache_key(start, end, avoid_types, k)
+        cached = self.route_cache.get(key, self.weight_version)
+        if cached is not None:
+            return [list(p) for p in cached]
+        paths = list(itertools.islice(self.iter_shortest_paths(start, end, avoid_types), k))
+        self.route_cache.put(key, self.weight_version, tuple(tuple(p) for p in paths))
+        return paths
 
-            all_paths.append(path)
 
-            # eliminar temporalmente la primera arista de la ruta encontrada
-            if len(path) > 1:
-                temporarily_remove_edge(path[0], path[1])
+    # ----------------------------------------------------------------------
+    # A* CON HEURÍSTICA POR PISOS
+    # ----------------------------------------------------------------------
+    def _heuristic_tables(self):
+        """
+        Cotas inferiores para A*, en unidades de multiplicador 1.0:
+        - slope: mínimo (peso / distancia en planta) de todas las aristas
+        - floor_cost[z1][z2]: mínimo coste de transiciones verticales para
+          pasar del piso z1 al z2 (Dijkstra sobre el grafo de pisos)
+        Se recalculan solo cuando cambia base_version.
+        """
+        if self._astar_tables and self._astar_tables[0] == self.base_version:
+            return self._astar_tables[1], self._astar_tables[2]
+
+        pos = self.positions_3d
+        mult = self.dynamic_multiplier
+        slope = float('inf')
+        floor_links = {}  # z -> {z2: coste mínimo de una arista entre pisos}
+        for a, edges in self.adj.items():
+            xa, ya, za = pos[a]
+            floor_links.setdefault(za, {})
+            for b, w, _ in edges:
+                xb, yb, zb = pos[b]
+                w = self.effective_weight(a, b, w) / mult
+                planar = ((xa - xb) ** 2 + (ya - yb) ** 2) ** 0.5
+                if planar > 0:
+                    slope = min(slope, w / planar)
+                if za != zb:
+                    links = floor_links[za]
+                    links[zb] = min(links.get(zb, float('inf')), w)
+        if slope == float('inf'):
+            slope = 0.0
+
+        floor_cost = {}
+        for z in floor_links:
+            dist = {z: 0}
+            pq = [(0, z)]
+            while pq:
+                d, u = heapq.heappop(pq)
+                if d > dist[u]:
+                    continue
+                for v, w in floor_links.get(u, {}).items():
+                    if d + w < dist.get(v, float('inf')):
+                        dist[v] = d + w
+                        heapq.heappush(pq, (d + w, v))
+            floor_cost[z] = dist
+
+        self._astar_tables = (self.base_version, slope, floor_cost)
+        return slope, floor_cost
+
+    def floor_heuristic(self, end):
+        """
+        Heurística admisible y consistente hacia end a partir de positions_3d:
+        max(distancia en planta * slope, coste vertical mínimo entre pisos),
+        escalada por el multiplicador actual (válida también si es < 1.0).
+        """
+        inf = float('inf')
+        pos = self.positions_3d
+        if any(n not in pos for n in self.adj):
+            # sin posición para todos los nodos no hay cota: Dijkstra
+            return lambda n: 0
+        slope, floor_cost = self._heuristic_tables()
+        mult = self.dynamic_multiplier
+        xe, ye, ze = pos[end]
+
+        def h(n):
+            x, y, z = pos[n]
+            vertical = floor_cost.get(z, {}).get(ze, inf)
+            if vertical == inf:
+                return inf
+            planar = ((x - xe) ** 2 + (y - ye) ** 2) ** 0.5 * slope
+            return mult * max(planar, vertical)
+        return h
+
+    def astar(self, start, end, avoid_types=None):
+        """
+        A* con heurística por pisos. Mismo contrato que dijkstra: (dist, camino).
+        Los nodos expandidos quedan en self.last_expanded.
+        """
+        if start not in self.adj or end not in self.adj:
+            return float('inf'), []
+        dist, path, self.last_expanded = self._search(
+            start, end, avoid_types, heuristic=self.floor_heuristic(end))
+        return dist, path
+
+    def compare_expansions(self, start, end, avoid_types=None):
+        """Nodos expandidos por A* y por Dijkstra para la misma consulta."""
+        self.astar(start, end, avoid_types)
+        astar_expanded = self.last_expanded
+        _, _, dijkstra_expanded = self._search(start, end, avoid_types)
+        return {"astar": astar_expanded, "dijkstra": dijkstra_expanded}
+
+    # ----------------------------------------------------------------------
+    # RUTA INCREMENTAL (ÁRBOL DINÁMICO)
+    # ----------------------------------------------------------------------
+    def track_source(self, start, avoid_types=None):
+        """
+        Mantiene un árbol de caminos mínimos desde start que se repara de
+        forma incremental tras cambios de congestión en pocas aristas.
+        """
+        avoid_types = list(avoid_types or [])
+        tree = self._tree
+        if tree is None or tree.source != start or tree.avoid_types != avoid_types:
+            if tree is not None:
+                tree.detach()
+            self._tree = DynamicSSSP(self, start, avoid_types)
+        return self._tree
+
+    def incremental_route(self, start, end, avoid_types=None, previous=None):
+        """
+        (dist, camino) usando el árbol dinámico de start. Si previous sigue
+        siendo óptimo con los pesos actuales se devuelve tal cual.
+        """
+        if start not in self.adj or end not in self.adj:
+            return float('inf'), []
+        dist, path = self.track_source(start, avoid_types).route(end)
+        if previous and previous[0] == start and previous[-1] == end:
+            old_cost = self.path_cost(previous, avoid_types)
+            if old_cost <= dist:
+                return old_cost, list(previous)
+        return dist, path
+
+    # ----------------------------------------------------------------------
+    # CONSULTAS EN LOTE (MUCHOS ORÍGENES / DESTINOS)
+    # ----------------------------------------------------------------------
+    def route_many(self, pairs, avoid_types=None):
+        """
+        Resuelve una lista de pares (origen, destino). Los pares se agrupan
+        por origen y se hace un único Dijkstra por origen, que se corta en
+        cuanto todos sus destinos están asentados. Devuelve un RouteBatch con
+        las distancias en un array NumPy y los caminos bajo demanda.
+        """
+        return batch.route_many(self, pairs, avoid_types)
+
+    def distance_table(self, sources, targets, avoid_types=None):
+        """
+        Tabla NumPy len(sources) x len(targets) de distancias (RouteTable),
+        con un Dijkstra con corte temprano por origen distinto.
+        """
+        return batch.distance_table(self, sources, targets, avoid_types)
 
-        # restaurar aristas eliminadas
-        for a, b, edge_a, edge_b in backup_removed:
-            self.adj[a].append(edge_a)
-            self.adj[b].append(edge_b)
+    def parallel_router(self, avoid_types=None, workers=None, chunk_size=256,
+                        with_paths=False):
+        """
+        Enrutador por procesos para cargas grandes de pares O/D:
+            router = g.parallel_router(workers=8, chunk_size=500)
+            for k, dist, path in router.run(pairs): ...
+        router.cancel() detiene la ejecución. Usa una instantánea del grafo
+        tomada al crearlo: las ediciones posteriores no le afectan.
+        """
+        return ParallelRouter(self, avoid_types, workers, chunk_size, with_paths)
 
-        return all_paths
+    def traffic_assignment(self, demand, avoid_types=None, method="frank_wolfe",
+                           max_iter=50, tol=1e-4, apply=False, **bpr):
+        """
+        Asigna la demanda {(origen, destino): volumen} hasta el equilibrio
+        con la función BPR (bpr: capacity, alpha, beta, reuse_tol). Con
+        apply=True los pesos de adj pasan a ser los tiempos congestionados
+        resultantes (restore_original los devuelve a su valor). Devuelve la
+        TrafficAssignment con flujos y brechas por iteración.
+        """
+        result = TrafficAssignment(self, demand, avoid_types, **bpr)
+        result.run(method, max_iter, tol)
+        if apply:
+            result.apply()
+        return result
 
+    # ----------------------------------------------------------------------
+    # MATRIZ DE DISTANCIAS (TODOS LOS PARES)
+    # ----------------------------------------------------------------------
+    def precompute_all_pairs(self, avoid_types=None, workers=None):
+        """
+        Activa y calcula la matriz de distancias + siguiente salto para
+        avoid_types. Queda etiquetada con base_version: cualquier edición la
+        invalida y se recalcula en la siguiente consulta (cambiar solo el
+        multiplicador global la reescala sin recalcular).
+        """
+        key = frozenset(avoid_types or [])
+        ap = AllPairs.compute(self, avoid_types, workers)
+        self._all_pairs[key] = (ap, workers)
+        return ap
+
+    def all_pairs(self, avoid_types=None):
+        """Matriz vigente para avoid_types, o None si no se activó."""
+        entry = self._all_pairs.get(frozenset(avoid_types or []))
+        if entry is None:
+            return None
+        ap, workers = entry
+        if not ap.is_valid(self):
+            ap = self.precompute_all_pairs(avoid_types, workers)
+        return ap
+
+    def all_pairs_route(self, start, end, avoid_types=None):
+        """
+        (dist, camino) desde la matriz de todos los pares si está activada;
+        si no, Dijkstra normal.
+        """
+        ap = self.all_pairs(avoid_types)
+        if ap is None:
+            return self.dijkstra(start, end, avoid_types)
+        path = ap.path(start, end)
+        if not path:
+            return float('inf'), []
+        return ap.distance(start, end, scale=self.dynamic_multiplier), path
 
     def dijkstra_with_penalty(self, start, end, avoid_types=None):
         """
@@ -310,6 +1112,7 @@ class Graph:
                 continue
             for v, w, t in self.adj[u]:  # suponiendo tu adj lista: (vecino, peso, tipo)
                 # si es tipo a evitar, agregamos penalización
+                w = self.effective_weight(u, v, w)
                 w_penalized = w + (50 if t in avoid_types else 0)  # ejemplo: 50 extra
                 if dist[u] + w_penalized < dist[v]:
                     dist[v] = dist[u] + w_penalized
@@ -344,12 +1147,12 @@ class Graph:
             a = path[i]
             b = path[i+1]
 
-            # buscar la arista en adj
-            edge = next((e for e in self.adj[a] if e[0] == b), None)
+            # buscar la arista en el índice
+            edge = self.get_edge(a, b)
             if edge is None:
                 continue
 
-            meters = edge[1]
+            meters = self.effective_weight(a, b, edge[1])
             edge_type = edge[2]
 
             # tiempo base
@@ -0,0 +1,166 @@
+# hierarchy.py
+import heapq
+
+
+class FloorHierarchy:
+    """
+    Enrutamiento jerárquico por pisos.
+
+    Los pisos (valor z de positions_3d) solo se conectan a través de
+    "portales": nodos con alguna arista hacia otro piso (ascensores,
+    escaleras, pasarelas). Para cada piso se precalculan las distancias
+    entre sus portales recorriendo solo ese piso; con eso se forma un grafo
+    superpuesto de portales. Una consulta explora completos únicamente el
+    piso de origen y el de destino, y el resto del edificio a través del
+    grafo de portales.
+
+    Las tablas se guardan en unidades de multiplicador 1.0 (se escalan al
+    consultar) y se invalidan por piso: un cambio de congestión en un piso
+    solo obliga a recalcular ese piso.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self._tables = {}  # (piso, tipos evitados) -> (dist, parents)
+        self._rebuild_floors()
+        self._stale = False  # cambio estructural pendiente (se rehace al consultar)
+        graph.add_listener(self._on_graph_change)
+
+    def detach(self):
+        self.graph.remove_listener(self._on_graph_change)
+
+    # ----------------------------------------------------------------------
+    # PISOS Y PORTALES
+    # ----------------------------------------------------------------------
+    def _rebuild_floors(self):
+        g = self.graph
+        self.floor_of = {n: g.positions_3d[n][2] if n in g.positions_3d else None
+                         for n in g.adj}
+        self.floors = {}
+        for n, z in self.floor_of.items():
+            self.floors.setdefault(z, set()).add(n)
+        self.portals = {}
+        for a, edges in g.adj.items():
+            for b, _, _ in edges:
+                if self.floor_of[a] != self.floor_of[b]:
+                    self.portals.setdefault(self.floor_of[a], set()).add(a)
+        self._tables = {}
+        self.preprocessed_floors = 0  # contador de pisos recalculados
+
+    def _on_graph_change(self, event, arcs=None):
+        if self._stale:
+            return
+        if event == "arcs":
+            for a, b in arcs:
+                fa, fb = self.floor_of.get(a), self.floor_of.get(b)
+                if fa == fb:
+                    self.invalidate_floor(fa)
+        elif event == "reset":
+            # no rehacer aquí: las ediciones seguidas (p.ej. borrar nodos)
+            # pagarían O(n) cada una
+            self._stale = True
+        # "scale": las tablas están en unidades de multiplicador 1.0
+
+    def invalidate_floor(self, floor):
+        for key in [k for k in self._tables if k[0] == floor]:
+            del self._tables[key]
+
+    def _sync(self):
+        if self._stale:
+            self._rebuild_floors()
+            self._stale = False
+
+    def _floor_table(self, floor, avoid_types):
+        """Distancias portal -> portal dentro del piso (unidades de multiplicador 1)."""
+        key = (floor, frozenset(avoid_types))
+        table = self._tables.get(key)
+        if table is not None:
+            return table
+
+        g = self.graph
+        mult = g.dynamic_multiplier
+        nodes = self.floors.get(floor, set())
+        dist_all, parents_all = {}, {}
+        for p in self.portals.get(floor, ()):
+            dist = {p: 0}
+            parent = {p: None}
+            pq = [(0, p)]
+            while pq:
+                d, u = heapq.heappop(pq)
+                if d > dist[u]:
+                    continue
+                for v, w in g._out_arcs(u, avoid_types):
+                    if v not in nodes:
+                        continue
+                    nd = d + w / mult
+                    if nd < dist.get(v, float('inf')):
+                        dist[v] = nd
+                        parent[v] = u
+                        heapq.heappush(pq, (nd, v))
+            dist_all[p] = {q: dist[q] for q in self.portals[floor] if q in dist and q != p}
+            parents_all[p] = parent
+        self._tables[key] = (dist_all, parents_all)
+        self.preprocessed_floors += 1
+        return dist_all, parents_all
+
+    # ----------------------------------------------------------------------
+    # CONSULTA
+    # ----------------------------------------------------------------------
+    def route(self, start, end, avoid_types=None):
+        """Mismo contrato que Graph.dijkstra: (distancia, camino)."""
+        g = self.graph
+        self._sync()
+        if start not in g.adj or end not in g.adj:
+            return float('inf'), []
+        avoid_types = list(avoid_types or [])
+        mult = g.dynamic_multiplier
+        inf = float('inf')
+        full = {self.floor_of[start], self.floor_of[end]}
+
+        dist = {start: 0}
+        # prev[v] = (u, piso del atajo o None si es arista real)
+        prev = {start: None}
+        pq = [(0, start)]
+        while pq:
+            d, u = heapq.heappop(pq)
+            if d > dist[u]:
+                continue
+            if u == end:
+                break
+            fu = self.floor_of[u]
+            for v, w in g._out_arcs(u, avoid_types):
+                # en pisos intermedios solo se usan aristas entre pisos
+                if fu not in full and self.floor_of[v] == fu:
+                    continue
+                if d + w < dist.get(v, inf):
+                    dist[v] = d + w
+                    prev[v] = (u, None)
+                    heapq.heappush(pq, (d + w, v))
+            if fu not in full:
+                shortcuts, _ = self._floor_table(fu, avoid_types)
+                for v, w in shortcuts.get(u, {}).items():
+                    nd = d + w * mult
+                    if nd < dist.get(v, inf):
+                        dist[v] = nd
+                        prev[v] = (u, fu)
+                        heapq.heappush(pq, (nd, v))
+
+        if end not in dist:
+            return inf, []
+
+        # reconstruir, desplegando los atajos en el camino real del piso
+        path = [end]
+        v = end
+        while prev[v] is not None:
+            u, floor = prev[v]
+            if floor is not None:
+                _, parents = self._floor_table(floor, avoid_types)
+                parent = parents[u]
+                x = parent[v]
+                while x != u:
+                    path.append(x)
+                    x = parent[x]
+            path.append(u)
+            v = u
+        path.reverse()
+        return dist[end], path
@@ -0,0 +1,163 @@
+# journal.py
+import json
+import os
+import uuid
+
+import scenario_io
+
+# operaciones de Graph que se registran (nombre del método = nombre en el diario).
+# Solo las que cambian lo que guarda save_scenario: las zonas de congestión
+# y el multiplicador no forman parte del escenario y se perderían al compactar
+OPS = ("add_node", "add_edge", "remove_node", "remove_nodes", "remove_edge",
+       "set_edge_congestion", "set_edge_weight", "set_position")
+
+
+class EditJournal:
+    """
+    Diario de ediciones de solo anexado junto a un escenario guardado.
+
+    - snapshot: escenario completo (JSON o .scnb, vía Graph.save_scenario)
+    - snapshot + ".journal": una línea JSON por edición {"op": ..., "args": [...]}
+
+    Cada edición se aplica al grafo y se anexa al diario (con fsync), así
+    que guardar cuesta lo que la edición y no lo que el recinto. Cada
+    compact_every ediciones el diario se compacta en un snapshot nuevo.
+    Al abrir se carga el snapshot y se reproduce el diario; el archivo del
+    diario no se crea ni se modifica hasta la primera edición, así que se
+    puede abrir un escenario de solo lectura.
+
+    Cada snapshot guarda un identificador de generación (nuevo en cada
+    compactación) y la primera línea del diario repite el de su snapshot,
+    así que copiar o restaurar ambos archivos juntos los mantiene asociados.
+    Si el proceso cae entre escribir el snapshot compactado y vaciar el
+    diario, el diario viejo ya no coincide y se descarta: sus ediciones
+    están en el snapshot.
+    """
+
+    def __init__(self, graph, snapshot, compact_every=500):
+        self.graph = graph
+        self.snapshot = snapshot
+        self.path = snapshot + ".journal"
+        self.compact_every = compact_every
+        self.pending = 0  # ediciones en el diario desde el último snapshot
+        self._file = None
+        # tamaño válido del diario existente al que seguir anexando
+        # (None = empezar uno nuevo en la primera edición)
+        self._append_at = None
+        self.generation = None  # generación del snapshot actual
+
+    @classmethod
+    def create(cls, graph, snapshot, compact_every=500):
+        """Guarda el grafo como snapshot nuevo y empieza un diario vacío."""
+        journal = cls(graph, snapshot, compact_every)
+        journal.compact()
+        return journal
+
+    @classmethod
+    def open(cls, graph, snapshot, compact_every=500):
+        """Carga snapshot + diario en graph y sigue anexando al mismo diario."""
+        journal = cls(graph, snapshot, compact_every)
+        graph.load_scenario(snapshot)
+        journal.generation = scenario_io.read_generation(snapshot)
+        # diario ausente o de otro snapshot: se empieza uno nuevo al editar
+        journal.pending = journal._replay() or 0
+        return journal
+
+    # ----------------------------------------------------------------------
+    # EDICIONES
+    # ----------------------------------------------------------------------
+    def apply(self, op, *args):
+        """Aplica graph.<op>(*args) y la anexa al diario si tuvo efecto."""
+        if op not in OPS:
+            raise ValueError(f"Operación no registrable: {op}")
+        if self._file is None:
+            # antes de editar: puede compactar el snapshot (ver _open_journal)
+            self._open_journal()
+        result = getattr(self.graph, op)(*args)
+        if result is False:
+            return result
+        self._file.write(json.dumps({"op": op, "args": list(args)}) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.pending += 1
+        if self.pending >= self.compact_every:
+            self.compact()
+        return result
+
+    # ----------------------------------------------------------------------
+    # COMPACTACIÓN Y REPRODUCCIÓN
+    # ----------------------------------------------------------------------
+    def _start_journal(self):
+        # diario nuevo (escritura atómica) con el identificador del snapshot
+        if self._file is not None:
+            self._file.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(json.dumps({"snapshot": self.generation}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._file = open(self.path, "a")
+
+    def _open_journal(self):
+        # primera edición: seguir el diario reproducido o empezar uno nuevo
+        # (un snapshot sin generación, guardado fuera del diario, se reescribe)
+        if self._append_at is None:
+            if self.generation is None:
+                self.compact()
+            else:
+                self._start_journal()
+            return
+        # descartar la cola corrupta que encontró _replay
+        if self._append_at != os.path.getsize(self.path):
+            with open(self.path, "r+") as f:
+                f.truncate(self._append_at)
+        self._file = open(self.path, "a")
+
+    def compact(self):
+        """Escribe el grafo completo como snapshot y vacía el diario."""
+        root, ext = os.path.splitext(self.snapshot)
+        tmp = root + ".tmp" + ext  # misma extensión: mismo formato
+        self.generation = uuid.uuid4().hex
+        self.graph.save_scenario(tmp, generation=self.generation)
+        os.replace(tmp, self.snapshot)
+        self._start_journal()
+        self.pending = 0
+        self._append_at = None
+
+    def _replay(self):
+        """Reproduce el diario; devuelve el número de ediciones o None si no aplica."""
+        try:
+            f = open(self.path, "r")
+        except FileNotFoundError:
+            return None
+        with f:
+            try:
+                header = json.loads(f.readline())
+            except json.JSONDecodeError:
+                return None
+            if self.generation is None or header.get("snapshot") != self.generation:
+                return None
+            count = 0
+            valid = f.tell()
+            for line in iter(f.readline, ""):
+                if not line.endswith("\n"):
+                    break  # última línea a medio escribir (caída)
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if entry.get("op") not in OPS:
+                    break
+                args = [tuple(a) if isinstance(a, list) else a for a in entry["args"]]
+                getattr(self.graph, entry["op"])(*args)
+                count += 1
+                valid = f.tell()
+        # la cola corrupta (si la hay) se descarta al anexar la primera edición
+        self._append_at = valid
+        return count
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -1,30 +1,55 @@
 # main.py
 import sys
 from PyQt5 import QtWidgets, QtCore
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QPushButton, QComboBox, QTextEdit, QSlider, QMessageBox, QListWidget, QAbstractItemView, QGroupBox
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QPushButton, QComboBox, QTextEdit, QSlider, QMessageBox, QListWidget, QAbstractItemView, QGroupBox, QGridLayout, QStackedWidget
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 
 from graph import build_large_casino
-from views import figure_floor, figure_3d, figure_mold
+import matplotlib.pyplot as plt
+from views import figure_floor, figure_3d, figure_mold, ViewCache
 from viewer_matplotlib_3d import Matplotlib3DWindow
+from viewer_pyqtgraph import PyQtGraphFloorView
+from crowd import CrowdSimulator
+from journal import EditJournal
 
 class CanvasWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.canvas = FigureCanvas(Figure(figsize=(6,5)))
+        # figuras cacheadas por ViewCache: no se cierran al sustituirlas
+        self.persistent = set()
+        # el lienzo de matplotlib y las vistas alternativas (pyqtgraph)
+        # comparten el área de dibujo
+        self.stack = QStackedWidget()
+        self.stack.addWidget(self.canvas)
         layout = QVBoxLayout()
-        layout.addWidget(self.canvas)
+        layout.addWidget(self.stack)
         self.setLayout(layout)
 
-    def draw_figure(self, fig):
+    def add_view(self, widget):
+        self.stack.addWidget(widget)
+
+    def show_view(self, widget=None):
+        # sin argumento: el lienzo de matplotlib
+        self.stack.setCurrentWidget(widget or self.canvas)
+
+    def draw_figure(self, fig, redraw=True):
+        self.show_view()
         # replace figure in canvas
-        self.canvas.figure.clf()
-        # draw the incoming figure onto canvas.figure by copying axes
+        old = self.canvas.figure
+        if old is not fig and old not in self.persistent:
+            old.clf()
+            # las figuras de views se crean con pyplot: cerrar la anterior
+            # para que no se acumulen en el registro de figuras
+            plt.close(old)
         # simple way: render the provided fig to canvas via canvas.figure = fig
-        # but safer: draw fig to canvas using backend renderer
         self.canvas.figure = fig
-        self.canvas.draw()
+        # enlazar la figura a este lienzo: draw_artist/blit usan el renderer
+        # de fig.canvas, que para las figuras de pyplot es otro lienzo
+        fig.set_canvas(self.canvas)
+        if redraw:
+            self.canvas.draw()
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -33,13 +58,19 @@ class MainWindow(QMainWindow):
         self.setGeometry(100,100,1100,700)
         self.all_paths = []      # Lista de rutas obtenidas
         self.current_path_idx = 0 # Índice de la ruta actualmente mostrada
+        self.max_routes = 3       # k rutas más cortas como máximo
+        self.route_iter = None    # generador perezoso de rutas (Yen)
+        self.route_version = None # versión de pesos con la que se generaron
         
-        # people for animation
-        self.people = []
+        # people for animation (simulador vectorizado, se crea en generate_people)
+        self.crowd = None
 
         # data & graph
         self.graph = build_large_casino()
+        # diario de ediciones del escenario guardado/cargado (None = sin archivo)
+        self.journal = None
         self.current_path = []
+        self.current_avoid = []   # tipos evitados en la ruta actual
         self.animation_index = 0
         self.timer = QtCore.QTimer()
         self.timer.setInterval(700)  # ms between steps
@@ -54,6 +85,12 @@ class MainWindow(QMainWindow):
         # left: canvas
         self.canvas_widget = CanvasWidget()
         main_layout.addWidget(self.canvas_widget, stretch=3)
+        # capas estáticas cacheadas por vista; la ruta se pinta encima
+        self.views = ViewCache(self.canvas_widget)
+        # vista de pisos alternativa (pyqtgraph) para recintos grandes
+        self.floor_view = PyQtGraphFloorView()
+        self.canvas_widget.add_view(self.floor_view)
+        self.current_floor = 1
 
         # right: controls
         scroll_area = QtWidgets.QScrollArea()
@@ -100,6 +137,18 @@ class MainWindow(QMainWindow):
         ])
         layout_route.addWidget(self.cmb_route_type)
 
+        # Algoritmo de búsqueda
+        layout_route.addWidget(QLabel("Algoritmo:"))
+        self.cmb_algorithm = QComboBox()
+        self.algorithms = {
+            "Dijkstra": "dijkstra",
+            "A* (heurística por pisos)": "astar",
+            "Dijkstra bidireccional": "bidirectional",
+            "Jerárquico (portales)": "hierarchical",
+        }
+        self.cmb_algorithm.addItems(list(self.algorithms))
+        layout_route.addWidget(self.cmb_algorithm)
+
         # Calculate route button
         btn_calc = QPushButton("Calcular Ruta")
         btn_calc.clicked.connect(self.calculate_route)
@@ -168,21 +217,16 @@ class MainWindow(QMainWindow):
         layout_views = QVBoxLayout()
         grp_views.setLayout(layout_views)
 
-        btn_floor1 = QPushButton("Ver Piso 1")
-        btn_floor1.clicked.connect(lambda: self.show_floor(1))
-        layout_views.addWidget(btn_floor1)
-
-        btn_floor2 = QPushButton("Ver Piso 2")
-        btn_floor2.clicked.connect(lambda: self.show_floor(2))
-        layout_views.addWidget(btn_floor2)
-
-        btn_floor3 = QPushButton("Ver Piso 3")
-        btn_floor3.clicked.connect(lambda: self.show_floor(3))
-        layout_views.addWidget(btn_floor3)
+        # un botón "Ver Piso N" por cada nivel z real del grafo
+        self.layout_floors = QGridLayout()
+        layout_views.addLayout(self.layout_floors)
+        self.refresh_floor_buttons()
 
-        btn_floor4 = QPushButton("Ver Piso 4")
-        btn_floor4.clicked.connect(lambda: self.show_floor(4))
-        layout_views.addWidget(btn_floor4)
+        layout_views.addWidget(QLabel("Motor de la vista de pisos:"))
+        self.cmb_floor_engine = QComboBox()
+        self.cmb_floor_engine.addItems(["matplotlib", "pyqtgraph"])
+        self.cmb_floor_engine.currentTextChanged.connect(lambda _: self.show_floor(self.current_floor))
+        layout_views.addWidget(self.cmb_floor_engine)
 
         btn_mold = QPushButton("Ver Molde (solo nodos)")
         btn_mold.clicked.connect(self.show_mold)
@@ -336,12 +380,24 @@ class MainWindow(QMainWindow):
             return
 
         # opción A: reemplazar peso con el valor ingresado (lo que pediste)
-        ok = self.graph.set_edge_congestion(start, end, value, absolute=True)
+        ok = self.edit_graph("set_edge_congestion", start, end, value, True)
         if not ok:
             QMessageBox.warning(self, "Error", "Arista no existe.")
             return
 
 
+        # reparar la ruta mostrada con el árbol dinámico en vez de recalcularla
+        if self.current_path:
+            old_path = self.current_path
+            _, path = self.graph.incremental_route(
+                old_path[0], old_path[-1], self.current_avoid, previous=old_path
+            )
+            if path:
+                self.all_paths[self.current_path_idx] = path
+                self.show_current_route()
+                if path != old_path:
+                    self.txt_info.append("La ruta cambió por la congestión.")
+
         self.txt_info.append(f"Congestión de {value:.2f} aplicada a la arista {start} -> {end}")
         self.show_3d(highlight=True)
 
@@ -364,25 +420,35 @@ class MainWindow(QMainWindow):
         s += "Tramos:\n"
         for i in range(len(path)-1):
             a,b = path[i], path[i+1]
-            # find weight from a to b
-            w = next((edge[1] for edge in self.graph.adj[a] if edge[0]==b), None)
+            # peso efectivo actual de a a b
+            w = self.graph.edge_weight(a, b)
             s += f"  {a} -> {b} (coste: {w:.2f})\n"
         return s
 
+    def refresh_floor_buttons(self):
+        # se llama tras cargar o editar nodos: el número de pisos puede cambiar
+        while self.layout_floors.count():
+            self.layout_floors.takeAt(0).widget().deleteLater()
+        for i in range(len(self.graph.floor_levels())):
+            btn = QPushButton(f"Ver Piso {i + 1}")
+            btn.clicked.connect(lambda _, floor=i + 1: self.show_floor(floor))
+            self.layout_floors.addWidget(btn, i // 2, i % 2)
+
     def show_floor(self, floor):
-        fig = figure_floor(self.graph, floor, highlight_path=self.current_path, show_edges=True, show_weights=True)
-        self.canvas_widget.draw_figure(fig)
+        self.current_floor = floor
+        if self.cmb_floor_engine.currentText() == "pyqtgraph":
+            self.floor_view.show_floor(self.graph, floor, self.current_path,
+                                       show_edges=True, show_weights=True)
+            self.canvas_widget.show_view(self.floor_view)
+            return
+        self.views.show(self.graph, "floor", self.current_path, floor=floor,
+                        show_edges=True, show_weights=True)
 
     def show_mold(self):
-        fig = figure_floor(self.graph, floor=1, highlight_path=None, show_edges=False)
-        # draw all floors' nodes in single 'mold' style: use figure_mold if wanted
-        from views import figure_mold
-        fig = figure_mold(self.graph)
-        self.canvas_widget.draw_figure(fig)
+        self.views.show(self.graph, "mold")
 
     def show_3d(self, highlight=False):
-        fig = figure_3d(self.graph, highlight_path=self.current_path if highlight else None, show_weights=False)
-        self.canvas_widget.draw_figure(fig)
+        self.views.show(self.graph, "3d", self.current_path if highlight else None)
 
     def show_congestion_heatmap_3d(self):
         """
@@ -407,7 +473,7 @@ class MainWindow(QMainWindow):
                 if a < b:
                     x2, y2, z2 = self.graph.positions_3d[b]
                     segments.append([[x1, y1, z1], [x2, y2, z2]])
-                    weights.append(w)
+                    weights.append(self.graph.effective_weight(a, b, w))
 
         # normalizar colores
         cmap = plt.cm.Reds
@@ -457,14 +523,16 @@ class MainWindow(QMainWindow):
             self.timer.stop()
             self.txt_info.append("Animación completada.")
             return
+        # avanzar también a las personas simuladas
+        if self.crowd is not None:
+            self.crowd.tick(self.timer.interval() / 1000.0)
         partial = self.current_path[:self.animation_index+2]  # up to next node
-        # Draw 3D with partial path highlighted
-        fig = figure_3d(self.graph, highlight_path=partial, show_weights=False)
-        self.canvas_widget.draw_figure(fig)
+        # Draw 3D with partial path highlighted (solo se actualiza la ruta)
+        self.views.show(self.graph, "3d", partial)
         # update info area with current step
         a = self.current_path[self.animation_index]
         b = self.current_path[self.animation_index+1]
-        w = next((edge[1] for edge in self.graph.adj[a] if edge[0]==b), 0)
+        w = self.graph.edge_weight(a, b) or 0
         self.txt_info.append(f"Paso {self.animation_index+1}: {a} -> {b} (coste: {w:.2f})")
         self.animation_index += 1
     def calculate_route(self):
@@ -480,10 +548,18 @@ class MainWindow(QMainWindow):
             avoid_types = ["elevator"]
 
         
-        # obtener 3 rutas más cortas usando penalización
-        self.all_paths = self.graph.k_shortest_paths(
-            start, end, k=3, avoid_types=avoid_types
+        # generador de rutas más cortas: solo se calcula la primera;
+        # las siguientes se piden en next_route
+        self.current_avoid = avoid_types
+        # el árbol dinámico para reparar la ruta tras congestión lo crea
+        # incremental_route en la primera reparación, no aquí
+        algorithm = self.algorithms[self.cmb_algorithm.currentText()]
+        self.route_iter = self.graph.iter_shortest_paths(
+            start, end, avoid_types=avoid_types, algorithm=algorithm
         )
+        self.route_version = self.graph.weight_version
+        self.all_paths = []
+        self.fetch_next_route()
         
         self.current_path_idx = 0
         
@@ -502,7 +578,7 @@ class MainWindow(QMainWindow):
 
         # calcular coste total
         total_cost = sum(
-            next(edge[1] for edge in self.graph.adj[path[j]] if edge[0] == path[j+1])
+            self.graph.edge_weight(path[j], path[j+1])
             for j in range(len(path)-1)
         )
 
@@ -525,7 +601,7 @@ class MainWindow(QMainWindow):
 
         for j in range(len(path)-1):
             a, b = path[j], path[j+1]
-            w = next(edge[1] for edge in self.graph.adj[a] if edge[0] == b)
+            w = self.graph.edge_weight(a, b)
 
             # tiempo del tramo si existe detail
             if detail:
@@ -538,12 +614,30 @@ class MainWindow(QMainWindow):
         self.txt_info.setPlainText(text)
         self.show_3d(highlight=True)
 
+    def fetch_next_route(self):
+        # pide una ruta más al generador; False si ya no quedan
+        if self.route_iter is None or len(self.all_paths) >= self.max_routes:
+            return False
+        path = next(self.route_iter, None)
+        if path is None:
+            self.route_iter = None
+            return False
+        self.all_paths.append(path)
+        return True
+
     def next_route(self):
         if not self.all_paths:
             QMessageBox.information(self, "Rutas", "Calcula una ruta primero.")
             return
-        # siguiente ruta
-        self.current_path_idx = (self.current_path_idx + 1) % len(self.all_paths)
+        # si los pesos cambiaron, las rutas ya no están ordenadas: recalcular
+        if self.route_version != self.graph.weight_version:
+            self.calculate_route()
+            return
+        # siguiente ruta (se calcula solo si aún no se había pedido)
+        if self.current_path_idx + 1 < len(self.all_paths) or self.fetch_next_route():
+            self.current_path_idx += 1
+        else:
+            self.current_path_idx = 0
         self.show_current_route()
 
     # Prueba de nodos :( espero que funcione por el bien de mi nota
@@ -556,11 +650,12 @@ class MainWindow(QMainWindow):
         if name in self.graph.adj:
             QMessageBox.warning(self, "Error", "El nodo ya existe.")
             return
-        self.graph.add_node(name, pos=(x, y, z))
+        self.edit_graph("add_node", name, (x, y, z))
         QMessageBox.information(self, "Nodo agregado", f"Nodo '{name}' agregado correctamente.")
         # actualizar combos
         for cmb in [self.cmb_edge_a, self.cmb_edge_b, self.cmb_del_node, self.cmb_del_edge_a, self.cmb_del_edge_b]:
             cmb.addItem(name)
+        self.refresh_floor_buttons()
         self.show_3d()
 
     def add_edge(self):
@@ -571,7 +666,7 @@ class MainWindow(QMainWindow):
         if a == b:
             QMessageBox.warning(self, "Error", "No se puede crear una arista al mismo nodo.")
             return
-        self.graph.add_edge(a, b, w, t)
+        self.edit_graph("add_edge", a, b, w, t)
         QMessageBox.information(self, "Arista agregada", f"Arista {a} -> {b} agregada correctamente.")
         self.show_3d()
 
@@ -580,11 +675,12 @@ class MainWindow(QMainWindow):
         if n not in self.graph.adj:
             QMessageBox.warning(self, "Error", "Nodo no existe.")
             return
-        self.graph.remove_node(n)
+        self.edit_graph("remove_node", n)
         QMessageBox.information(self, "Nodo eliminado", f"Nodo '{n}' eliminado correctamente.")
         # actualizar combos
         for cmb in [self.cmb_edge_a, self.cmb_edge_b, self.cmb_del_node, self.cmb_del_edge_a, self.cmb_del_edge_b]:
             cmb.clear(); cmb.addItems(sorted(self.graph.nodes()))
+        self.refresh_floor_buttons()
         self.show_3d()
 
     def delete_edge(self):
@@ -592,40 +688,52 @@ class MainWindow(QMainWindow):
         if a not in self.graph.adj or b not in [edge[0] for edge in self.graph.adj[a]]:
             QMessageBox.warning(self, "Error", "Arista no existe.")
             return
-        self.graph.remove_edge(a, b)
+        self.edit_graph("remove_edge", a, b)
         QMessageBox.information(self, "Arista eliminada", f"Arista {a} -> {b} eliminada correctamente.")
         self.show_3d()
     
+    def edit_graph(self, op, *args):
+        # las ediciones pasan por el diario si hay un escenario abierto:
+        # quedan guardadas sin reescribir el archivo completo
+        if self.journal is not None:
+            return self.journal.apply(op, *args)
+        return getattr(self.graph, op)(*args)
+
     # Guardar/Cargar grafo
     def save_scenario(self):
-        filename, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Guardar escenario", "", "JSON Files (*.json)")
+        filename, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Guardar escenario", "", "JSON Files (*.json);;Escenario binario (*.scnb)")
         if filename:
-            self.graph.save_scenario(filename)
+            # snapshot completo + diario vacío para las ediciones siguientes
+            if self.journal is not None:
+                self.journal.close()
+            self.journal = EditJournal.create(self.graph, filename)
             QMessageBox.information(self, "Guardar", f"Escenario guardado en {filename}")
 
     def load_scenario(self):
-        filename, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Cargar escenario", "", "JSON Files (*.json)")
+        filename, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Cargar escenario", "", "Escenarios (*.json *.scnb);;JSON Files (*.json);;Escenario binario (*.scnb)")
         if filename:
-            self.graph.load_scenario(filename)
+            # snapshot + ediciones pendientes del diario
+            if self.journal is not None:
+                self.journal.close()
+            self.journal = EditJournal.open(self.graph, filename)
             # actualizar combos
             nodes = sorted(self.graph.nodes())
             for cmb in [self.cmb_edge_a, self.cmb_edge_b, self.cmb_del_node, self.cmb_del_edge_a, self.cmb_del_edge_b]:
                 cmb.clear()
                 cmb.addItems(nodes)
+            self.refresh_floor_buttons()
             self.show_3d()
             QMessageBox.information(self, "Cargar", f"Escenario cargado desde {filename}")
     # people animation
     def generate_people(self, num_people=5):
-        import random
-        self.people = []
-        for _ in range(num_people):
-            # elige una ruta al azar entre las calculadas
-            if not self.all_paths:
-                continue
-            path = random.choice(self.all_paths)
-            color = (random.random(), random.random(), random.random())  # RGB random
-            self.people.append({"path": path, "index": 0, "color": color})
-        self.txt_info.append(f"{len(self.people)} personas generadas para animación.")
+        if not self.all_paths:
+            self.txt_info.append("0 personas generadas para animación.")
+            return
+        self.crowd = CrowdSimulator(self.graph, avoid_types=self.current_avoid)
+        # cada persona sigue una ruta al azar entre las calculadas
+        choice = self.crowd.rng.integers(len(self.all_paths), size=num_people)
+        self.crowd.spawn_paths([self.all_paths[i] for i in choice])
+        self.txt_info.append(f"{num_people} personas generadas para animación.")
     def export_current_view(self):
         fig = self.canvas_widget.canvas.figure
 
@@ -641,7 +749,8 @@ class MainWindow(QMainWindow):
             return
 
         try:
-            fig.savefig(filename, dpi=300)
+            # la ruta de las vistas cacheadas es un artista animado
+            self.views.savefig(fig, filename, dpi=300)
             QMessageBox.information(self, "Exportar", f"Imagen guardada en:\n{filename}")
         except Exception as e:
             QMessageBox.critical(self, "Error", f"No se pudo exportar la imagen:\n{e}")
@@ -649,8 +758,8 @@ class MainWindow(QMainWindow):
         import matplotlib.pyplot as plt
         saved_files = []
 
-        # Exportar pisos 1–4
-        for floor in [1, 2, 3, 4]:
+        # Exportar todos los pisos
+        for floor in range(1, len(self.graph.floor_levels()) + 1):
             fig = figure_floor(self.graph, floor, highlight_path=self.current_path, show_edges=True, show_weights=True)
             fname = f"{folder_path}/piso_{floor}.png"
             fig.savefig(fname, dpi=300)
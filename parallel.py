@@ -0,0 +1,118 @@
+# parallel.py
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import batch
+
+
+class ParallelRouter:
+    """
+    Enrutador en lote sobre un pool de procesos.
+
+    - El grafo se envía a cada proceso UNA sola vez, como instantánea CSR de
+      solo lectura (con el multiplicador y las zonas del momento).
+    - Los pares se agrupan por origen y se empaquetan en bloques de unos
+      chunk_size pares; cada bloque hace un Dijkstra por origen.
+    - run() devuelve los resultados (índice, dist, camino) en el MISMO orden
+      que los pares de entrada, a medida que van llegando.
+    - cancel() (desde otro hilo o dentro del bucle) detiene el envío de
+      bloques, cancela los pendientes y termina run().
+    """
+
+    def __init__(self, graph, avoid_types=None, workers=None, chunk_size=256,
+                 with_paths=False):
+        self.snapshot = (graph.csr(), list(avoid_types or [])) + graph.weight_factors()
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = max(1, int(chunk_size))
+        self.with_paths = with_paths
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def make_chunks(self, pairs):
+        """Bloques [(origen, [(índice, destino), ...]), ...] de hasta chunk_size pares."""
+        chunks, current, size = [], [], 0
+        for start, idx in batch.group_by_source(pairs).items():
+            for i in range(0, len(idx), self.chunk_size):
+                part = [(k, pairs[k][1]) for k in idx[i:i + self.chunk_size]]
+                if size + len(part) > self.chunk_size and current:
+                    chunks.append(current)
+                    current, size = [], 0
+                current.append((start, part))
+                size += len(part)
+        if current:
+            chunks.append(current)
+        # enviar primero los bloques que contienen los primeros índices
+        chunks.sort(key=lambda c: min(k for _, part in c for k, _ in part))
+        return chunks
+
+    def run(self, pairs):
+        pairs = list(pairs)
+        chunks = self.make_chunks(pairs)
+        ready = {}
+        next_k = 0
+        max_in_flight = self.workers * 2
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.snapshot, self.with_paths)) as pool:
+            pending = set()
+            it = iter(chunks)
+            try:
+                while True:
+                    while not self.cancelled and len(pending) < max_in_flight:
+                        chunk = next(it, None)
+                        if chunk is None:
+                            break
+                        pending.add(pool.submit(_solve_chunk, chunk))
+                    if not pending or self.cancelled:
+                        break
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        for k, d, path in fut.result():
+                            ready[k] = (d, path)
+                    # entregar en orden todo lo que ya es consecutivo
+                    while next_k in ready:
+                        d, path = ready.pop(next_k)
+                        yield next_k, d, path
+                        next_k += 1
+                        if self.cancelled:
+                            break
+            finally:
+                for fut in pending:
+                    fut.cancel()
+
+
+# --------------------------------------------------------------------------
+# LADO DEL PROCESO TRABAJADOR
+# --------------------------------------------------------------------------
+_snapshot = None
+_with_paths = False
+
+
+def _init_worker(snapshot, with_paths):
+    global _snapshot, _with_paths
+    _snapshot = snapshot
+    _with_paths = with_paths
+
+
+def _solve_chunk(chunk):
+    csr, avoid_types, scale, node_zones, edge_zones = _snapshot
+    factors = (scale, node_zones, edge_zones)
+    inf = float('inf')
+    out = []
+    for start, part in chunk:
+        costs, prev = batch.solve_source(csr, start, [e for _, e in part],
+                                         avoid_types, factors)
+        for k, end in part:
+            d = costs.get(end, inf) if costs else inf
+            path = None
+            if _with_paths and d != inf:
+                path = csr.path_to(prev, csr.index[end])
+            out.append((k, d, path))
+    return out
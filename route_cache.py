@@ -0,0 +1,64 @@
+# route_cache.py
+from collections import OrderedDict
+
+
+class RouteCache:
+    """
+    Caché LRU acotada para resultados de rutas.
+
+    Las claves incluyen la versión de pesos del grafo, así que una edición
+    nunca devuelve un resultado viejo; además, al ver una versión nueva se
+    vacía de golpe para no ocupar memoria con entradas que ya no sirven.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._data:
+                self.invalidations += 1
+                self._data.clear()
+            self._version = version
+
+    def get(self, key, version):
+        self._check_version(version)
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, version, value):
+        if self.maxsize <= 0:
+            return
+        self._check_version(version)
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def __len__(self):
+        return len(self._data)
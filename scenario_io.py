@@ -0,0 +1,277 @@
+# scenario_io.py
+import json
+import os
+import re
+import struct
+
+import numpy as np
+
+from csr import CSRGraph
+
+CHUNK_SIZE = 1 << 16  # caracteres leídos por bloque
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _Stream:
+    """
+    Lector incremental de JSON: mantiene en memoria solo un bloque del
+    archivo más el valor que se está decodificando.
+    """
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        # descarta lo ya consumido y lee otro bloque; False si no queda nada
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Siguiente carácter no blanco (sin consumirlo), o '' al final."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Se esperaba {char!r}", self.buf, self.pos)
+        self.pos += 1
+
+    def value(self, decoder=json.JSONDecoder()):
+        """Decodifica el siguiente valor JSON completo."""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # valor partido entre bloques: leer más y reintentar
+                if not self._fill():
+                    raise
+                continue
+            # un número al final del bloque puede estar incompleto
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def items(self, close):
+        """Recorre los elementos de un objeto/lista ya abierto hasta close."""
+        if self.peek() == close:
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == close:
+                return
+            if char != ",":
+                raise json.JSONDecodeError("Se esperaba ',' o cierre", self.buf, self.pos - 1)
+
+
+def iter_scenario(filename, chunk_size=CHUNK_SIZE):
+    """
+    Recorre un escenario JSON (formato de Graph.save_scenario) en memoria
+    acotada. Genera ("position", nodo, [x, y, z]) y ("edge", dict de la
+    arista, None) en el orden del archivo; las claves desconocidas se ignoran.
+    """
+    with open(filename, "r") as f:
+        s = _Stream(f, chunk_size)
+        s.expect("{")
+        for _ in s.items("}"):
+            key = s.value()
+            s.expect(":")
+            if key == "positions" and s.peek() == "{":
+                s.pos += 1
+                for _ in s.items("}"):
+                    node = s.value()
+                    s.expect(":")
+                    yield "position", node, s.value()
+            elif key == "edges" and s.peek() == "[":
+                s.pos += 1
+                for _ in s.items("]"):
+                    yield "edge", s.value(), None
+            else:
+                s.value()
+
+
+def write_scenario(graph, filename, generation=None):
+    """
+    Escribe el escenario directamente desde graph.adj, elemento a elemento,
+    sin construir la lista de aristas. Mismo formato que antes: aristas
+    no dirigidas guardadas una vez (a < b). generation (opcional) se guarda
+    como primera clave (ver read_generation).
+    """
+    dumps = json.dumps
+    with open(filename, "w") as f:
+        f.write("{\n")
+        if generation is not None:
+            f.write(f'    "generation": {dumps(generation)},\n')
+        f.write('    "positions": {')
+        sep = "\n"
+        for node, pos in graph.positions_3d.items():
+            f.write(f"{sep}        {dumps(node)}: {dumps(list(pos))}")
+            sep = ",\n"
+        f.write('\n    },\n    "edges": [')
+        sep = "\n"
+        for a, edges in graph.adj.items():
+            for b, w, t in edges:
+                if a < b:
+                    f.write(f'{sep}        {{"start": {dumps(a)}, "end": {dumps(b)}, '
+                            f'"weight": {dumps(w)}, "type": {dumps(t)}}}')
+                    sep = ",\n"
+        f.write("\n    ]\n}\n")
+
+
+# --------------------------------------------------------------------------
+# FORMATO BINARIO (MAPEADO EN MEMORIA)
+# --------------------------------------------------------------------------
+# Archivo .scnb:
+#   MAGIC (8 bytes) | versión uint32 | largo del encabezado uint32 |
+#   encabezado JSON (tipos de arista y {array: dtype, forma, offset}) |
+#   arrays crudos alineados a ALIGN bytes
+# Los arrays son los del CSR (offsets, targets, weights, types), la tabla
+# de nombres (utf-8 separados por \0) y las posiciones (n, 3).
+BINARY_EXTENSION = ".scnb"
+BINARY_MAGIC = b"SCNBIN\0\0"
+BINARY_VERSION = 1
+ALIGN = 64
+
+
+def is_binary(filename):
+    return str(filename).lower().endswith(BINARY_EXTENSION)
+
+
+def _pad(n):
+    return -n % ALIGN
+
+
+def write_binary(graph, filename, generation=None):
+    """Escribe el grafo (CSR + nombres + posiciones) en formato binario."""
+    csr = graph.csr()
+    names = csr.names + [n for n in graph.positions_3d if n not in csr.index]
+    n = len(names)
+    has_pos = np.array([name in graph.positions_3d for name in names], dtype=bool)
+    coords = [graph.positions_3d.get(name, (0, 0, 0)) for name in names]
+    integral = all(float(c).is_integer() for pos in coords for c in pos)
+    positions = np.array(coords, dtype=np.int64 if integral else np.float64).reshape(n, 3)
+    # los nodos solo con posición no tienen aristas: se extienden los offsets
+    offsets = np.concatenate([csr.offsets,
+                              np.full(n - csr.num_nodes(), csr.num_edges(), dtype=np.int64)])
+    arrays = {
+        "names": np.frombuffer("\0".join(names).encode("utf-8"), dtype=np.uint8),
+        "positions": positions,
+        "has_position": has_pos,
+        "offsets": offsets,
+        "targets": csr.targets,
+        "weights": csr.weights,
+        "types": csr.types,
+    }
+
+    spec = {}
+    offset = 0
+    for key, arr in arrays.items():
+        spec[key] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += arr.nbytes + _pad(arr.nbytes)
+    header = json.dumps({"num_nodes": n, "type_names": csr.type_names,
+                         "generation": generation, "arrays": spec}).encode("utf-8")
+    prefix = len(BINARY_MAGIC) + 8 + len(header)
+    data_start = prefix + _pad(prefix)
+
+    # archivo temporal + os.replace: el CSR puede ser un memmap del propio
+    # filename (escenario cargado de ahí) y truncarlo invalidaría el mapeo
+    tmp = filename + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(BINARY_MAGIC)
+        f.write(struct.pack("<II", BINARY_VERSION, len(header)))
+        f.write(header)
+        f.write(b"\0" * (data_start - prefix))
+        for arr in arrays.values():
+            f.write(np.ascontiguousarray(arr).tobytes())
+            f.write(b"\0" * _pad(arr.nbytes))
+    os.replace(tmp, filename)
+
+
+def _binary_header(filename):
+    # (encabezado JSON, inicio de los datos) de un escenario binario
+    with open(filename, "rb") as f:
+        magic = f.read(len(BINARY_MAGIC))
+        if magic != BINARY_MAGIC:
+            raise ValueError(f"{filename} no es un escenario binario")
+        version, header_len = struct.unpack("<II", f.read(8))
+        if version > BINARY_VERSION:
+            raise ValueError(f"Versión de escenario binario no soportada: {version}")
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    prefix = len(BINARY_MAGIC) + 8 + header_len
+    return header, prefix + _pad(prefix)
+
+
+def read_generation(filename):
+    """
+    Identificador de generación guardado en el escenario (o None). Lo usa
+    EditJournal para asociar el diario a su snapshot aunque el archivo se
+    copie o restaure. En JSON es la primera clave: no se lee el resto.
+    """
+    if is_binary(filename):
+        return _binary_header(filename)[0].get("generation")
+    with open(filename, "r") as f:
+        s = _Stream(f)
+        s.expect("{")
+        if s.peek() == "}":
+            return None
+        key = s.value()
+        s.expect(":")
+        return s.value() if key == "generation" else None
+
+
+def read_binary(filename):
+    """
+    Abre un escenario binario. Los arrays del CSR se mapean en memoria en
+    modo copia-en-escritura: no se leen hasta usarlos y las ediciones de
+    pesos no tocan el archivo. La tabla de nombres y las posiciones sí se
+    leen enteras (O(nodos)). Devuelve (CSRGraph, {nodo: (x, y, z)}).
+    """
+    header, data_start = _binary_header(filename)
+
+    arrays = {}
+    for key, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        if not np.prod(shape, dtype=np.int64):
+            arrays[key] = np.empty(shape, dtype=dtype)  # memmap no admite tamaño 0
+        else:
+            arrays[key] = np.memmap(filename, dtype=dtype, mode="c", shape=shape,
+                                    offset=data_start + spec["offset"])
+
+    n = header["num_nodes"]
+    names = arrays["names"].tobytes().decode("utf-8").split("\0") if n else []
+    has_pos = arrays["has_position"].tolist()
+    coords = arrays["positions"].tolist()
+    positions = {name: tuple(c) for name, c, ok in zip(names, coords, has_pos) if ok}
+    csr = CSRGraph(names, arrays["offsets"], arrays["targets"], arrays["weights"],
+                   arrays["types"], header["type_names"])
+    return csr, positions
+
+
+def convert_scenario(src, dst):
+    """Convierte un escenario entre JSON y binario según las extensiones."""
+    from graph import Graph  # graph importa este módulo
+
+    g = Graph()
+    g.load_scenario(src)
+    g.save_scenario(dst)
@@ -0,0 +1,266 @@
+# traffic.py
+import numpy as np
+
+# capacidad por defecto (personas por unidad de tiempo) según el tipo de arista
+DEFAULT_CAPACITY = {"normal": 60.0, "stairs": 30.0, "elevator": 15.0}
+
+METHODS = ("frank_wolfe", "msa")
+
+
+class TrafficAssignment:
+    """
+    Asignación de tráfico de equilibrio (Wardrop) de una matriz de demanda
+    O/D sobre el grafo, con la función de demora BPR:
+
+        t(x) = t0 * (1 + alpha * (x / c) ** beta)
+
+    - t0: peso efectivo actual de la arista (multiplicador y zonas incluidos)
+    - c: capacidad de la arista (por tipo, o un valor único)
+    - x: flujo asignado a la arista (dirigida)
+
+    Cada iteración hace una carga "todo o nada" con UN árbol de caminos
+    mínimos por origen compartido por todos sus destinos, guardado por
+    niveles de profundidad para recorrerlo en bloque con NumPy. Re-ruteo
+    incremental: como ningún camino baja más que el tiempo que más bajó
+    (d), el coste mínimo actual de un origen es al menos (1 - d) veces el
+    que tenía al calcular su árbol. Si el árbol con los tiempos nuevos no
+    supera esa cota en más de reuse_tol * brecha anterior, se reutiliza sin
+    Dijkstra y la cota entra en el coste mínimo, así que la brecha nunca se
+    subestima (reuse_tol=0 solo reutiliza árboles que no empeoraron).
+    Métodos:
+    - "frank_wolfe": paso con búsqueda lineal sobre la función de Beckmann
+    - "msa": paso 1 / (k + 1) (método de promedios sucesivos)
+
+    La asignación trabaja sobre una instantánea CSR; apply() vuelca los
+    tiempos congestionados en los pesos de Graph.adj.
+    """
+
+    def __init__(self, graph, demand, avoid_types=None, capacity=None,
+                 alpha=0.15, beta=4.0, reuse_tol=0.5):
+        self.graph = graph
+        self.avoid_types = list(avoid_types or [])
+        self.alpha = alpha
+        self.beta = beta
+        self.reuse_tol = reuse_tol
+        csr = graph.csr()
+        self.csr = csr
+        self.base_version = graph.base_version
+        n = csr.num_nodes()
+        self.src = np.repeat(np.arange(n), np.diff(csr.offsets))
+        self.dst = csr.targets.astype(np.int64)
+        mult, node_zones, edge_zones = graph.weight_factors()
+        self.t0 = csr.effective_weights(mult, node_zones, edge_zones)
+        self.capacity = self._capacities(capacity)
+        allowed = np.array(csr.allowed_types(self.avoid_types) or [True])
+        self.allowed = allowed[csr.types]
+
+        # demanda agrupada por origen: id -> (ids destino, volúmenes)
+        self.demand = {}
+        self.unassigned = 0.0  # demanda sin nodo origen/destino en el grafo
+        for (o, d), volume in demand.items():
+            i, j = csr.index.get(o), csr.index.get(d)
+            if i is None or j is None:
+                self.unassigned += volume
+            elif i != j and volume > 0:
+                self.demand.setdefault(i, {}).setdefault(j, 0.0)
+                self.demand[i][j] += volume
+        self.total_demand = sum(sum(v.values()) for v in self.demand.values())
+
+        self.flow = np.zeros(len(self.dst))
+        self.gaps = []  # brecha relativa de cada iteración
+        self.iterations = 0
+        self.trees_built = 0
+        self.trees_reused = 0
+        self._reuse_limit = 0.0  # exceso relativo admitido para reutilizar un árbol
+        # origen -> (niveles, tiempos con los que se calculó, coste mínimo entonces)
+        self._trees = {}
+
+    @classmethod
+    def from_matrix(cls, graph, nodes, matrix, **kwargs):
+        """Demanda como matriz cuadrada: matrix[i][j] viajes de nodes[i] a nodes[j]."""
+        matrix = np.asarray(matrix, dtype=float)
+        demand = {}
+        for i, j in zip(*np.nonzero(matrix)):
+            demand[(nodes[i], nodes[j])] = float(matrix[i, j])
+        return cls(graph, demand, **kwargs)
+
+    def _capacities(self, capacity):
+        csr = self.csr
+        if capacity is None:
+            capacity = DEFAULT_CAPACITY
+        if isinstance(capacity, dict):
+            per_type = np.array([capacity.get(t, DEFAULT_CAPACITY.get(t, 60.0))
+                                 for t in csr.type_names] or [1.0], dtype=float)
+            return per_type[csr.types]
+        return np.full(len(self.dst), float(capacity))
+
+    # ----------------------------------------------------------------------
+    # FUNCIÓN DE DEMORA
+    # ----------------------------------------------------------------------
+    def times(self, flow=None):
+        """Tiempo BPR de cada arista con el flujo dado (por defecto, el actual)."""
+        x = self.flow if flow is None else flow
+        return self.t0 * (1.0 + self.alpha * (x / self.capacity) ** self.beta)
+
+    def objective(self, flow):
+        """Función de Beckmann: suma de las integrales de t(x) de 0 a x."""
+        a, b = self.alpha, self.beta
+        return float(np.sum(self.t0 * (flow + a * self.capacity / (b + 1)
+                                       * (flow / self.capacity) ** (b + 1))))
+
+    # ----------------------------------------------------------------------
+    # CARGA TODO O NADA
+    # ----------------------------------------------------------------------
+    def _build_tree(self, origin, times):
+        """
+        Dijkstra desde origin agrupado por profundidad: lista de niveles
+        (nodos, aristas de llegada, padres), cada uno como arrays.
+        """
+        arc_of = {}
+        _, _, order = self.csr.sssp(origin, self.avoid_types, weights=times,
+                                    via=arc_of)
+        nodes = np.array(order[1:], dtype=np.int64)
+        arcs = np.array([arc_of[v] for v in order[1:]], dtype=np.int64)
+        parents = self.src[arcs]
+        # el padre se asienta antes que el hijo: una pasada basta
+        depth = {origin: 0}
+        for v, u in zip(order[1:], parents.tolist()):
+            depth[v] = depth[u] + 1
+        level = np.array([depth[v] for v in order[1:]], dtype=np.int64)
+        by_level = np.argsort(level, kind="stable")
+        cuts = np.nonzero(np.diff(level[by_level]))[0] + 1
+        return [(nodes[i], arcs[i], parents[i]) for i in np.split(by_level, cuts)
+                if len(i)]
+
+    def _decrease(self, times, ref):
+        """Máxima bajada relativa de los tiempos permitidos respecto a ref."""
+        mask = self.allowed & (ref > 0)
+        if not np.any(mask):
+            return 0.0
+        return max(0.0, float(np.max((ref[mask] - times[mask]) / ref[mask])))
+
+    def all_or_nothing(self, times):
+        """
+        Carga toda la demanda por los caminos mínimos: (flujo, coste mínimo
+        total). Con árboles reutilizados el coste devuelto es una cota
+        inferior del mínimo (ver reuse_tol).
+        """
+        n = len(self.csr.names)
+        load = np.zeros(len(self.dst))
+        best = 0.0
+        decrease = {}  # id(tiempos de referencia) -> bajada relativa máxima
+        for origin, dests in self.demand.items():
+            ids = np.fromiter(dests.keys(), dtype=np.int64, count=len(dests))
+            volumes = np.fromiter(dests.values(), dtype=float, count=len(dests))
+            cached = self._trees.get(origin)
+            while True:
+                if cached is None:
+                    levels = self._build_tree(origin, times)
+                    self.trees_built += 1
+                else:
+                    levels, ref, base = cached
+                label = np.full(n, np.inf)
+                label[origin] = 0.0
+                for nodes, arcs, parents in levels:
+                    label[nodes] = label[parents] + times[arcs]
+                reached = np.isfinite(label[ids])
+                cost = float(np.dot(volumes[reached], label[ids[reached]]))
+                if cached is None:
+                    self._trees[origin] = (levels, times, cost)
+                    best += cost
+                    break
+                # ningún camino bajó más que los tiempos: el mínimo actual es
+                # al menos (1 - bajada) * el mínimo con que se calculó el árbol
+                d = decrease.get(id(ref))
+                if d is None:
+                    d = decrease[id(ref)] = self._decrease(times, ref)
+                lower = (1.0 - d) * base
+                if cost - lower <= self._reuse_limit * cost:
+                    self.trees_reused += 1
+                    best += lower
+                    break
+                cached = None
+            # acumular desde las hojas hacia el origen, nivel a nivel
+            node_load = np.zeros(n)
+            np.add.at(node_load, ids[reached], volumes[reached])
+            for nodes, arcs, parents in reversed(levels):
+                volume = node_load[nodes]
+                load[arcs] += volume
+                np.add.at(node_load, parents, volume)
+        return load, best
+
+    # ----------------------------------------------------------------------
+    # ITERACIÓN
+    # ----------------------------------------------------------------------
+    def _line_search(self, x, direction, steps=30):
+        # bisección sobre la derivada de Beckmann: sum(d * t(x + l * d)) = 0
+        lo, hi = 0.0, 1.0
+        if np.dot(direction, self.times(x + direction)) <= 0:
+            return 1.0
+        for _ in range(steps):
+            mid = (lo + hi) / 2
+            if np.dot(direction, self.times(x + mid * direction)) > 0:
+                hi = mid
+            else:
+                lo = mid
+        return (lo + hi) / 2
+
+    def run(self, method="frank_wolfe", max_iter=50, tol=1e-4):
+        """
+        Itera hasta que la brecha relativa (coste total - coste mínimo) /
+        coste total baja de tol o se alcanza max_iter. Devuelve self.
+        """
+        if method not in METHODS:
+            raise ValueError(f"Método de asignación desconocido: {method}")
+        if not self.iterations:
+            self.flow, _ = self.all_or_nothing(self.t0)
+        for _ in range(max_iter):
+            times = self.times()
+            target, best = self.all_or_nothing(times)
+            total = float(np.dot(times, self.flow))
+            gap = (total - best) / total if total > 0 else 0.0
+            self.gaps.append(gap)
+            self._reuse_limit = self.reuse_tol * gap
+            self.iterations += 1
+            if gap < tol:
+                break
+            direction = target - self.flow
+            if method == "msa":
+                step = 1.0 / (self.iterations + 1)
+            else:
+                step = self._line_search(self.flow, direction)
+            self.flow = self.flow + step * direction
+        return self
+
+    @property
+    def converged_gap(self):
+        return self.gaps[-1] if self.gaps else float('inf')
+
+    # ----------------------------------------------------------------------
+    # RESULTADOS
+    # ----------------------------------------------------------------------
+    def edge_flows(self):
+        """{(a, b): flujo} de las aristas con flujo (paralelas sumadas)."""
+        names = self.csr.names
+        out = {}
+        for k in np.nonzero(self.flow > 0)[0]:
+            key = (names[self.src[k]], names[self.dst[k]])
+            out[key] = out.get(key, 0.0) + float(self.flow[k])
+        return out
+
+    def apply(self):
+        """
+        Multiplica el peso base de cada registro de Graph.adj por su factor
+        BPR (t / t0). El orden de aristas del CSR es el de adj, así que la
+        arista k es el registro k - offsets[a] de adj[a].
+        """
+        g = self.graph
+        if g.base_version != self.base_version:
+            raise ValueError("El grafo cambió desde que se calculó la asignación")
+        ratio = 1.0 + self.alpha * (self.flow / self.capacity) ** self.beta
+        k = 0
+        for a in self.csr.names:
+            for edge in g.adj[a]:
+                edge[1] = edge[1] * float(ratio[k])
+                k += 1
+        g._mark_dirty()
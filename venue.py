@@ -0,0 +1,101 @@
+# venue.py
+import numpy as np
+
+from graph import Graph
+
+
+def build_venue(floors=4, width=20, depth=15, density=0.9, spacing=3.0,
+                elevators=2, stairs=2, edge_mix=None, diagonals=0.05,
+                floor_height=4, seed=None, graph=None):
+    """
+    Genera un recinto multi-piso paramétrico y reproducible (misma semilla,
+    mismo grafo) con posiciones 3D.
+
+    - floors: número de pisos; el piso f está en z = 1 + floor_height * (f - 1)
+      (como build_large_casino: 1, 5, 9, 13...)
+    - width x depth: rejilla de cada piso; density es la fracción de celdas
+      ocupadas por un nodo (las celdas de los huecos verticales siempre lo están)
+    - spacing: distancia entre celdas vecinas (peso de una arista recta)
+    - elevators / stairs: número de huecos de ascensor / escalera; cada hueco
+      une la misma celda de pisos consecutivos con aristas "elevator" / "stairs"
+    - edge_mix: {tipo: proporción} de las aristas dentro de cada piso
+      (por defecto todas "normal")
+    - diagonals: probabilidad de un atajo diagonal en cada celda
+    - graph: Graph de destino (por defecto uno nuevo)
+
+    Las aristas se generan con NumPy y entran en el grafo con una sola
+    llamada a Graph.load_edges. Nombres de nodo: "F{piso}_{x}_{y}".
+    """
+    rng = np.random.default_rng(seed)
+    g = graph if graph is not None else Graph()
+    cells = width * depth
+
+    # huecos verticales: celdas distintas elegidas al azar
+    n_shafts = min(elevators + stairs, cells)
+    shaft_cells = rng.choice(cells, size=n_shafts, replace=False)
+    shaft_types = ["elevator"] * min(elevators, n_shafts)
+    shaft_types += ["stairs"] * (n_shafts - len(shaft_types))
+
+    # ocupación de la rejilla (pisos x celdas)
+    occupied = rng.random((floors, cells)) < density
+    occupied[:, shaft_cells] = True
+
+    xs = np.tile(np.arange(width), depth)
+    ys = np.repeat(np.arange(depth), width)
+    names = np.array([f"F{f + 1}_{x}_{y}"
+                      for f in range(floors) for x, y in zip(xs, ys)], dtype=object)
+
+    def node_id(f, c):
+        return f * cells + c
+
+    src, dst, weight = [], [], []
+    cell = np.arange(cells)
+    # vecinos dentro del piso: derecha, abajo y (opcional) diagonales
+    steps = [(1, 0, 1.0), (0, 1, 1.0)]
+    if diagonals > 0:
+        steps += [(1, 1, np.sqrt(2)), (-1, 1, np.sqrt(2))]
+    for dx, dy, length in steps:
+        ok = (xs + dx >= 0) & (xs + dx < width) & (ys + dy < depth)
+        a_cell = cell[ok]
+        b_cell = a_cell + dx + dy * width
+        for f in range(floors):
+            keep = occupied[f, a_cell] & occupied[f, b_cell]
+            if dx and dy:
+                keep &= rng.random(len(a_cell)) < diagonals
+            src.append(node_id(f, a_cell[keep]))
+            dst.append(node_id(f, b_cell[keep]))
+            weight.append(np.full(keep.sum(), spacing * length))
+    src = np.concatenate(src)
+    dst = np.concatenate(dst)
+    weight = np.concatenate(weight)
+
+    mix = edge_mix or {"normal": 1.0}
+    mix_types = list(mix)
+    p = np.array([mix[t] for t in mix_types], dtype=float)
+    types = np.array(mix_types, dtype=object)[
+        rng.choice(len(mix_types), size=len(src), p=p / p.sum())]
+
+    # huecos: celda c del piso f con la del piso f + 1
+    vertical = {"elevator": 2.0, "stairs": 6.0}
+    v_src, v_dst, v_w, v_t = [], [], [], []
+    for c, t in zip(shaft_cells, shaft_types):
+        f = np.arange(floors - 1)
+        v_src.append(node_id(f, c))
+        v_dst.append(node_id(f + 1, c))
+        v_w.append(np.full(floors - 1, vertical[t]))
+        v_t.append(np.full(floors - 1, t, dtype=object))
+    if v_src:
+        src = np.concatenate([src] + v_src)
+        dst = np.concatenate([dst] + v_dst)
+        weight = np.concatenate([weight] + v_w)
+        types = np.concatenate([types] + v_t)
+
+    z = 1 + floor_height * np.repeat(np.arange(floors), cells)
+    keep = occupied.ravel()
+    px = (xs * spacing).tolist()
+    py = (ys * spacing).tolist()
+    positions = {names[i]: (px[i % cells], py[i % cells], int(z[i]))
+                 for i in np.nonzero(keep)[0]}
+
+    g.load_edges(zip(names[src], names[dst], weight.tolist(), types), positions)
+    return g
@@ -0,0 +1,124 @@
+# viewer_pyqtgraph.py
+import numpy as np
+import pyqtgraph as pg
+from PyQt5.QtCore import Qt
+
+from views import _segments, _path_segments
+
+# etiquetas (nombres y pesos) visibles como máximo: se muestran al acercar
+LABEL_MAX = 300
+
+
+class PyQtGraphFloorView(pg.PlotWidget):
+    """
+    Vista 2D de un piso con pyqtgraph (sin OpenGL), con el mismo contenido
+    que views.figure_floor: nodos, aristas por tipo, pesos y ruta resaltada.
+
+    Todo el piso son unos pocos items alimentados con arrays de NumPy: un
+    scatter para los nodos, una curva por estilo de arista (continua /
+    discontinua, connect="pairs") y otra para la ruta, así que desplazar y
+    hacer zoom no depende del número de aristas. Los arrays del piso se
+    reconstruyen solo si cambia (grafo, piso, versión); cambiar de ruta solo
+    actualiza la curva de la ruta. Las etiquetas de texto se crean para lo
+    que está a la vista y solo si no pasan de LABEL_MAX.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent, background='w')
+        self.setAspectLocked(True)
+        self.showGrid(x=True, y=True)
+        self.setLabel('bottom', "X")
+        self.setLabel('left', "Y")
+
+        self.edges = [
+            pg.PlotCurveItem(connect="pairs", pen=pg.mkPen((128, 128, 128, 180), width=1)),
+            pg.PlotCurveItem(connect="pairs", pen=pg.mkPen((128, 128, 128, 180), width=1,
+                                                           style=Qt.DashLine)),
+        ]
+        self.nodes = pg.ScatterPlotItem(size=12, pen=None, brush=pg.mkBrush('skyblue'))
+        self.path = pg.PlotCurveItem(connect="pairs", pen=pg.mkPen('r', width=3))
+        for z, item in enumerate(self.edges + [self.nodes, self.path]):
+            item.setZValue(z)
+            self.addItem(item)
+
+        self.key = None
+        self.floor_nodes = frozenset()
+        self.node_xy = np.empty((0, 2))
+        self.node_names = []
+        self.weight_xy = np.empty((0, 2))
+        self.weight_texts = []
+        self._name_items = []    # TextItem reutilizables
+        self._weight_items = []
+        self.getViewBox().sigRangeChanged.connect(self._update_labels)
+
+    def show_floor(self, graph, floor, highlight_path=None, show_edges=True,
+                   show_weights=False):
+        version = graph.weight_version if show_weights else graph.base_version
+        key = (id(graph), floor, show_edges, show_weights, version)
+        if key != self.key:
+            self._build(graph, floor, show_edges, show_weights)
+            self.key = key
+            self.autoRange()
+            # si autoRange no cambia el rango, sigRangeChanged no llega
+            self._update_labels()
+        self.set_path(graph, highlight_path)
+
+    def set_path(self, graph, path):
+        if path and len(path) >= 2:
+            segs = _path_segments(graph, path, self.floor_nodes)
+        else:
+            segs = np.empty((0, 2, 2))
+        self.path.setData(segs[:, :, 0].ravel(), segs[:, :, 1].ravel())
+
+    def _build(self, graph, floor, show_edges, show_weights):
+        self.setTitle(f"Piso {floor} — Grafo (vista 2D)")
+        z = graph.floor_z(floor)
+        self.floor_nodes = graph.floor_nodes(z) if z is not None else frozenset()
+        pos = graph.positions_3d
+
+        self.node_names = list(self.floor_nodes)
+        self.node_xy = np.array([pos[n][:2] for n in self.node_names],
+                                dtype=float).reshape(-1, 2)
+        self.nodes.setData(pos=self.node_xy)
+
+        pairs = graph.floor_edges(z) if z is not None else ()
+        solid, dashed, labels = _segments(graph, pairs)
+        for item, segs in zip(self.edges, (solid, dashed)):
+            if not show_edges:
+                segs = segs[:0]
+            item.setData(segs[:, :, 0].ravel(), segs[:, :, 1].ravel())
+
+        if show_edges and show_weights and labels:
+            self.weight_xy = np.array([((x + nx) / 2, (y + ny) / 2)
+                                       for _, _, _, ((x, y), (nx, ny)) in labels])
+            self.weight_texts = [f"{graph.effective_weight(a, b, w):.1f}"
+                                 for a, b, w, _ in labels]
+        else:
+            self.weight_xy = np.empty((0, 2))
+            self.weight_texts = []
+
+    # ----------------------------------------------------------------------
+    # ETIQUETAS
+    # ----------------------------------------------------------------------
+    def _update_labels(self, *args):
+        self._place_labels(self._name_items, self.node_xy, self.node_names, 'k')
+        self._place_labels(self._weight_items, self.weight_xy, self.weight_texts,
+                           (0, 128, 0))
+
+    def _place_labels(self, pool, xy, texts, color):
+        (x0, x1), (y0, y1) = self.viewRange()
+        inside = np.nonzero((xy[:, 0] >= x0) & (xy[:, 0] <= x1)
+                            & (xy[:, 1] >= y0) & (xy[:, 1] <= y1))[0]
+        if len(inside) > LABEL_MAX:
+            inside = inside[:0]
+        while len(pool) < len(inside):
+            item = pg.TextItem(color=color, anchor=(0, 1))
+            item.setZValue(len(self.edges) + 2)
+            self.addItem(item, ignoreBounds=True)
+            pool.append(item)
+        for item, i in zip(pool, inside):
+            item.setText(texts[i])
+            item.setPos(*xy[i])
+            item.show()
+        for item in pool[len(inside):]:
+            item.hide()
@@ -2,6 +2,47 @@
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D  # noqa: F401
 import numpy as np
+from collections import OrderedDict
+from matplotlib.collections import LineCollection
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
+
+# ----------------------------------------
+#     ARRAYS PARA COLECCIONES
+# ----------------------------------------
+DASHED_TYPES = ("stairs", "elevator")
+
+
+def _segments(graph, pairs=None, dims=2):
+    """
+    Aristas no dirigidas (a < b) como arrays de segmentos (k, 2, dims),
+    separadas en (normales, escalera/ascensor). Si se da pairs (p.ej.
+    graph.floor_edges(z)), solo esos pares (a, b) con todos sus registros.
+    Devuelve también la lista (a, b, w) en el mismo orden para las
+    etiquetas de peso.
+    """
+    pos = graph.positions_3d
+    solid, dashed, labels = [], [], []
+    if pairs is None:
+        records = ((a, b, w, t) for a, edges in graph.adj.items()
+                   for b, w, t in edges if a < b)
+    else:
+        records = ((a, b, w, t) for a, b in pairs
+                   for _, w, t in graph.edge_slots(a, b))
+    for a, b, w, t in records:
+        seg = (pos[a][:dims], pos[b][:dims])
+        (dashed if t in DASHED_TYPES else solid).append(seg)
+        labels.append((a, b, w, seg))
+    shape = (-1, 2, dims)
+    return (np.array(solid, dtype=float).reshape(shape),
+            np.array(dashed, dtype=float).reshape(shape), labels)
+
+
+def _path_segments(graph, path, nodes=None, dims=2):
+    pos = graph.positions_3d
+    segs = [(pos[a][:dims], pos[b][:dims]) for a, b in zip(path, path[1:])
+            if nodes is None or (a in nodes and b in nodes)]
+    return np.array(segs, dtype=float).reshape(-1, 2, dims)
+
 
 # ----------------------------------------
 #     VISTA 2D POR PISO
@@ -13,60 +54,51 @@ def figure_floor(graph, floor, highlight_path=None, show_edges=True, show_weight
     ax.set_ylabel("Y")
     ax.grid(True)
 
-    # Mapea el número de piso (1,2,3,4) al valor Z que usaste en graph.py
-    floor_z = {1: 1, 2: 5, 3: 9, 4: 13}
-    z = floor_z.get(floor, floor)  # por si acaso
-    nodes = [n for n,(x,y,f) in graph.positions_3d.items() if f == z]
-
+    # el piso N es el N-ésimo nivel z del grafo (índice por piso de Graph)
+    z = graph.floor_z(floor)
+    nodes = graph.floor_nodes(z) if z is not None else set()
+    pos = graph.positions_3d
+    lw = plt.rcParams["lines.linewidth"]
 
     # ---------------------------
-    # NODOS
+    # NODOS (un solo scatter)
     # ---------------------------
+    if nodes:
+        xy = np.array([pos[n][:2] for n in nodes], dtype=float)
+        ax.scatter(xy[:, 0], xy[:, 1], s=180, zorder=3, color='skyblue')
     for node in nodes:
-        x,y,_ = graph.positions_3d[node]
-        ax.scatter(x, y, s=180, zorder=3, color='skyblue')
+        x,y,_ = pos[node]
         ax.text(x+0.12, y+0.12, node, fontsize=8)
 
     # ---------------------------
     # ARISTAS EN EL MISMO PISO
     # ---------------------------
-    # ---------------------------
-    # ARISTAS EN EL MISMO PISO
-    # ---------------------------
+    # una LineCollection por estilo: continua (normal) y discontinua
+    # (escalera/ascensor); cada arista no dirigida una sola vez (a < b)
     if show_edges:
-        for node in nodes:
-            x, y, _ = graph.positions_3d[node]
-
-            # ahora las aristas tienen 3 valores: neighbor, weight, type
-            for neighbor, w, t in graph.adj.get(node, []):
-                if neighbor in nodes:
-
-                    # 🔥 evitar duplicar aristas (solo dibujar A→B cuando A < B)
-                    if node >= neighbor:
-                        continue
-
-                    nx, ny, _ = graph.positions_3d[neighbor]
+        pairs = graph.floor_edges(z) if z is not None else ()
+        solid, dashed, labels = _segments(graph, pairs)
+        for segs, style in ((solid, "-"), (dashed, "--")):
+            if len(segs):
+                ax.add_collection(LineCollection(segs, colors='gray', alpha=0.7,
+                                                 linestyles=style, linewidths=lw,
+                                                 zorder=2))
 
-                    # Escalera/ascensor → línea punteada
-                    style = "--" if t in ("stairs", "elevator") else "-"
-
-                    ax.plot([x, nx], [y, ny], style, color='gray', alpha=0.7)
-
-                    if show_weights:
-                        mx, my = (x + nx) / 2, (y + ny) / 2
-                        ax.text(mx, my, f"{w:.1f}", fontsize=11, color='green')
+        if show_weights:
+            for a, b, w, ((x, y), (nx, ny)) in labels:
+                mx, my = (x + nx) / 2, (y + ny) / 2
+                w = graph.effective_weight(a, b, w)
+                ax.text(mx, my, f"{w:.1f}", fontsize=11, color='green')
 
     # ---------------------------
     # CAMINO RESALTADO
     # ---------------------------
     if highlight_path and len(highlight_path) >= 2:
-        for i in range(len(highlight_path)-1):
-            a,b = highlight_path[i], highlight_path[i+1]
-            if a in nodes and b in nodes:
-                x1,y1,_ = graph.positions_3d[a]
-                x2,y2,_ = graph.positions_3d[b]
-                ax.plot([x1,x2], [y1,y2], color='red', linewidth=3, zorder=5)
+        segs = _path_segments(graph, highlight_path, nodes)
+        if len(segs):
+            ax.add_collection(LineCollection(segs, colors='red', linewidths=3, zorder=5))
 
+    ax.autoscale_view()
     ax.set_aspect('equal', 'box')
     return fig
 
@@ -76,8 +108,11 @@ def figure_mold(graph):
     ax.set_title("Molde del grafo (solo nodos)")
     ax.grid(True)
 
-    for node,(x,y,f) in graph.positions_3d.items():
-        ax.scatter(x, y + (f-1)*0.4, s=100, color='orange')
+    items = list(graph.positions_3d.items())
+    if items:
+        xyz = np.array([p for _, p in items], dtype=float)
+        ax.scatter(xyz[:, 0], xyz[:, 1] + (xyz[:, 2]-1)*0.4, s=100, color='orange')
+    for node,(x,y,f) in items:
         ax.text(x+0.12, y+0.12 + (f-1)*0.4, node, fontsize=8)
 
     ax.set_aspect('equal', 'box')
@@ -88,47 +123,203 @@ def figure_3d(graph, highlight_path=None, show_weights=False):
     fig = plt.figure(figsize=(8,7))
     ax = fig.add_subplot(111, projection='3d')
     ax.set_title("Mapa 3D del Casino")
+    lw = plt.rcParams["lines.linewidth"]
 
     # ---------------------------
-    # NODOS 3D
+    # NODOS 3D (un solo scatter)
     # ---------------------------
-    for node,(x,y,f) in graph.positions_3d.items():
-        ax.scatter(x, y, f, s=60, color='skyblue')
+    items = list(graph.positions_3d.items())
+    if items:
+        xyz = np.array([p for _, p in items], dtype=float)
+        # sin depthshade: con un punto por llamada el color no se atenuaba
+        ax.scatter(xyz[:, 0], xyz[:, 1], xyz[:, 2], s=60, color='skyblue',
+                   depthshade=False)
+    for node,(x,y,f) in items:
         ax.text(x+0.12, y+0.12, f+0.05, node, fontsize=8)
 
     # ---------------------------
     # ARISTAS 3D
     # ---------------------------
-    for u, neighbors in graph.adj.items():
-        x1,y1,f1 = graph.positions_3d[u]
-
-        for v,w,t in neighbors:
-            x2,y2,f2 = graph.positions_3d[v]
-            xs = [x1,x2]
-            ys = [y1,y2]
-            zs = [f1,f2]
-
-            color = "gray"
-            style = ":" if t in ("stairs", "elevator") else "-"
-
-            ax.plot(xs, ys, zs, style, color=color, alpha=0.7)
+    # una Line3DCollection por estilo; cada arista no dirigida una sola vez
+    solid, dashed, labels = _segments(graph, dims=3)
+    for segs, style in ((solid, "-"), (dashed, ":")):
+        if len(segs):
+            ax.add_collection3d(Line3DCollection(segs, colors='gray', alpha=0.7,
+                                                 linestyles=style, linewidths=lw))
 
-            if show_weights:
-                mx,my,mz = (x1+x2)/2, (y1+y2)/2, (f1+f2)/2
-                ax.text(mx, my, mz, f"{w:.1f}", fontsize=11, color='green', fontweight="bold")
+    if show_weights:
+        for u, v, w, ((x1, y1, f1), (x2, y2, f2)) in labels:
+            mx,my,mz = (x1+x2)/2, (y1+y2)/2, (f1+f2)/2
+            w = graph.effective_weight(u, v, w)
+            ax.text(mx, my, mz, f"{w:.1f}", fontsize=11, color='green', fontweight="bold")
 
 
     # ---------------------------
     # CAMINO RESALTADO 3D
     # ---------------------------
     if highlight_path and len(highlight_path) >= 2:
-        for i in range(len(highlight_path)-1):
-            a,b = highlight_path[i], highlight_path[i+1]
-            x1,y1,f1 = graph.positions_3d[a]
-            x2,y2,f2 = graph.positions_3d[b]
-            ax.plot([x1,x2], [y1,y2], [f1,f2], color='red', linewidth=3)
+        # línea (no colección): mplot3d ordena las colecciones por
+        # profundidad y dejaría la ruta bajo las aristas
+        xs, ys, zs = zip(*(graph.positions_3d[n] for n in highlight_path))
+        ax.plot(xs, ys, zs, color='red', linewidth=3, zorder=10)
 
     ax.set_xlabel("X")
     ax.set_ylabel("Y")
     ax.set_zlabel("Piso")
     return fig
+
+
+# ----------------------------------------
+#     CACHÉ DE CAPAS (FONDO ESTÁTICO + RUTA)
+# ----------------------------------------
+class _Layer:
+    # figura cacheada de una vista: fondo estático + artista de la ruta
+    def __init__(self, fig, overlay, nodes=None):
+        self.fig = fig
+        self.overlay = overlay  # None si la vista no muestra ruta
+        self.nodes = nodes      # nodos del piso (vista "floor")
+        self.background = None  # raster del fondo (copy_from_bbox)
+        self.size = None        # tamaño de la figura al capturarlo
+
+
+class ViewCache:
+    """
+    Vistas por capas sobre un CanvasWidget: "floor" (piso N), "mold" y "3d".
+
+    La capa estática de cada vista (nodos, aristas, etiquetas y pesos) se
+    dibuja una vez y se guarda como raster; la ruta es un artista animado
+    que se pinta encima con blitting. Clave de la capa estática: (vista,
+    parámetros, grafo, versión), con weight_version si la vista muestra
+    pesos y base_version si no. Volver a un piso ya visto, cambiar de ruta
+    o avanzar la animación solo restaura el raster y pinta la ruta.
+
+    El raster se vuelve a capturar en cada dibujo completo del lienzo
+    (cambio de tamaño, rotación de la cámara 3D), así que siempre
+    corresponde a la cámara actual. Se guardan como mucho max_views
+    figuras (LRU).
+    """
+
+    def __init__(self, canvas_widget, max_views=8):
+        self.widget = canvas_widget
+        self.max_views = max_views
+        self._layers = OrderedDict()  # clave -> _Layer
+        self._exporting = False
+
+    def show(self, graph, view, path=None, **params):
+        """
+        Muestra la vista con path resaltado. Parámetros: floor, show_edges y
+        show_weights ("floor"); show_weights ("3d"); ninguno ("mold").
+        """
+        self.widget.show_view()
+        layer = self._layer(graph, view, params)
+        if layer.overlay is not None:
+            self._set_path(graph, view, layer, path)
+
+        canvas = self.widget.canvas
+        cached = (layer.background is not None and canvas.supports_blit
+                  and layer.size == tuple(layer.fig.bbox.size))
+        if not cached:
+            # dibujo completo: _on_draw captura el fondo y pinta la ruta
+            self.widget.draw_figure(layer.fig)
+            return
+        if canvas.figure is not layer.fig:
+            self.widget.draw_figure(layer.fig, redraw=False)
+        canvas.restore_region(layer.background)
+        if layer.overlay is not None:
+            layer.fig.axes[0].draw_artist(layer.overlay)
+        canvas.blit(layer.fig.bbox)
+
+    def savefig(self, fig, *args, **kwargs):
+        """
+        fig.savefig con la ruta incluida: durante la exportación la capa de
+        la ruta es un artista normal y el dibujo no sustituye al fondo cacheado.
+        """
+        layer = next((l for l in self._layers.values() if l.fig is fig), None)
+        self._exporting = True
+        if layer is not None and layer.overlay is not None:
+            layer.overlay.set_animated(False)
+        try:
+            fig.savefig(*args, **kwargs)
+        finally:
+            self._exporting = False
+            if layer is not None and layer.overlay is not None:
+                layer.overlay.set_animated(True)
+
+    def clear(self):
+        for layer in self._layers.values():
+            self._release(layer)
+        self._layers.clear()
+
+    def _layer(self, graph, view, params):
+        version = graph.weight_version if params.get("show_weights") else graph.base_version
+        view_key = (view, tuple(sorted(params.items())), id(graph))
+        key = view_key + (version,)
+        layer = self._layers.get(key)
+        if layer is not None:
+            self._layers.move_to_end(key)
+            return layer
+
+        # las capas de versiones anteriores de la misma vista ya no sirven
+        for old in [k for k in self._layers if k[:3] == view_key]:
+            self._release(self._layers.pop(old))
+        layer = self._build(graph, view, params)
+        self._layers[key] = layer
+        while len(self._layers) > self.max_views:
+            self._release(self._layers.popitem(last=False)[1])
+        return layer
+
+    def _build(self, graph, view, params):
+        if view == "floor":
+            floor = params["floor"]
+            fig = figure_floor(graph, floor, None, params.get("show_edges", True),
+                               params.get("show_weights", False))
+            z = graph.floor_z(floor)
+            nodes = graph.floor_nodes(z) if z is not None else frozenset()
+            # animated: el dibujo completo la omite y se pinta aparte
+            overlay = LineCollection([], colors='red', linewidths=3, zorder=5,
+                                     animated=True)
+            fig.axes[0].add_collection(overlay, autolim=False)
+            layer = _Layer(fig, overlay, nodes)
+        elif view == "mold":
+            layer = _Layer(figure_mold(graph), None)
+        elif view == "3d":
+            fig = figure_3d(graph, None, params.get("show_weights", False))
+            # zorder por encima de las colecciones (mplot3d las ordena por
+            # profundidad) para que al exportar la ruta quede encima
+            (overlay,) = fig.axes[0].plot([], [], [], color='red', linewidth=3,
+                                          zorder=10, animated=True)
+            layer = _Layer(fig, overlay)
+        else:
+            raise ValueError(f"Vista desconocida: {view}")
+
+        self.widget.persistent.add(layer.fig)
+        layer.fig.canvas.mpl_connect("draw_event",
+                                     lambda event: self._on_draw(layer))
+        return layer
+
+    def _set_path(self, graph, view, layer, path):
+        if view == "3d":
+            if path:
+                xs, ys, zs = zip(*(graph.positions_3d[n] for n in path))
+            else:
+                xs, ys, zs = [], [], []
+            layer.overlay.set_data_3d(xs, ys, zs)
+        elif path and len(path) >= 2:
+            layer.overlay.set_segments(_path_segments(graph, path, layer.nodes))
+        else:
+            layer.overlay.set_segments([])
+
+    def _on_draw(self, layer):
+        canvas = self.widget.canvas
+        if self._exporting or canvas.figure is not layer.fig:
+            return
+        layer.background = canvas.copy_from_bbox(layer.fig.bbox)
+        layer.size = tuple(layer.fig.bbox.size)
+        if layer.overlay is not None:
+            layer.fig.axes[0].draw_artist(layer.overlay)
+
+    def _release(self, layer):
+        # la figura en pantalla la cierra draw_figure al sustituirla
+        self.widget.persistent.discard(layer.fig)
+        if self.widget.canvas.figure is not layer.fig:
+            plt.close(layer.fig)